@@ -0,0 +1,355 @@
+"""
+Optimizador de canasta por orden: asigna cada línea de pedido a un único vendor
+minimizando el costo puesto total de la orden, respetando el min_purchase de cada
+vendor usado y cobrando su shipping_cost si su parte queda bajo min_free_delivery.
+
+Solo entran los vendors con relación activa con el POS (y, si se pide, los
+pendientes). Cada orden se resuelve con una búsqueda local rápida (partiendo de la
+oferta más barata por línea, con movimientos de una línea y cierres de vendor) y,
+si la canasta es chica, con un branch and bound exacto acotado que parte de esa
+solución. Las órdenes se reparten entre procesos.
+"""
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from landed_cost import TERMINOS, terminos_vendor
+from scoring_engine import STATUS_ACTIVO, columna_vendor
+
+STATUS_PENDIENTE = 2
+
+# Canastas que se resuelven de forma exacta y nodos máximos del branch and bound
+LIMITE_EXACTO_LINEAS = 12
+LIMITE_NODOS = 200_000
+# Iteraciones máximas de la búsqueda local
+LIMITE_ITERACIONES = 200
+# Órdenes por tarea al repartir entre procesos
+ORDENES_POR_TAREA = 2_000
+
+_EPS = 1e-9
+
+COLUMNAS_RESUMEN = ['point_of_sale_id', 'order_id', 'lineas', 'lineas_sin_oferta', 'vendors_usados',
+                    'costo_productos', 'costo_envio', 'costo_total', 'costo_linea_a_linea', 'total_actual',
+                    'ahorro', 'cumple_minimos', 'metodo']
+COLUMNAS_ASIGNACION = ['point_of_sale_id', 'order_id', 'super_catalog_id', 'vendor_id', 'costo_linea',
+                       'precio_actual']
+
+
+def ofertas_elegibles(df_clasificado, condiciones, incluir_pendientes=False):
+    """
+    Mejor oferta de cada vendor elegible por línea (point_of_sale_id, order_id,
+    super_catalog_id) con las condiciones del vendor en la zona del POS, ordenada
+    por orden. Devuelve también el precio actual de cada línea.
+    """
+    vendor_col = columna_vendor(df_clasificado)
+    columnas = ['point_of_sale_id', 'order_id', 'super_catalog_id', 'precio_total_vendedor', 'status', 'geo_zone']
+    if df_clasificado.empty or vendor_col is None or any(col not in df_clasificado.columns for col in columnas):
+        return pd.DataFrame(), pd.DataFrame()
+
+    lineas = ['point_of_sale_id', 'order_id', 'super_catalog_id']
+    # Precio actual de la línea: valor_vendedor de su primera fila (aunque sea NaN)
+    primeras = df_clasificado.drop_duplicates(lineas)
+    precio_actual = primeras[lineas].reset_index(drop=True)
+    precio_actual['precio_actual'] = (primeras['valor_vendedor'].to_numpy(dtype=float)
+                                      if 'valor_vendedor' in primeras.columns else np.nan)
+
+    status = [STATUS_ACTIVO, STATUS_PENDIENTE] if incluir_pendientes else [STATUS_ACTIVO]
+    elegibles = df_clasificado[df_clasificado['status'].isin(status) & df_clasificado[vendor_col].notna()
+                               & df_clasificado['precio_total_vendedor'].notna()]
+    ofertas = (elegibles.groupby(lineas + [vendor_col, 'geo_zone'], sort=False, observed=True, dropna=False)
+               ['precio_total_vendedor'].min()
+               .reset_index()
+               .rename(columns={vendor_col: 'vendor_id', 'precio_total_vendedor': 'costo_linea'}))
+
+    terminos = terminos_vendor(ofertas['vendor_id'].to_numpy(), ofertas['geo_zone'].astype(object).to_numpy(),
+                               condiciones)
+    ofertas = pd.concat([ofertas.drop(columns=['geo_zone']), terminos], axis=1)
+    ofertas = ofertas.sort_values(['point_of_sale_id', 'order_id'], kind='stable', ignore_index=True)
+    return ofertas, precio_actual
+
+
+class _Canasta:
+    """
+    Una orden como matriz de costos línea x vendor con las condiciones de cada
+    vendor; el costo de un vendor depende solo de su subtotal y de si se usa
+    """
+
+    def __init__(self, costos, min_purchase, shipping_cost, min_free_delivery):
+        self.costos = costos
+        self.n_lineas, self.n_vendors = costos.shape
+        self.min_purchase = min_purchase.tolist()
+        self.shipping_cost = shipping_cost.tolist()
+        self.min_free_delivery = min_free_delivery.tolist()
+        # Candidatos de cada línea de más barato a más caro
+        orden = np.argsort(costos, axis=1, kind='stable')
+        self.candidatos = [[int(v) for v in fila if np.isfinite(costos[i, v])] for i, fila in enumerate(orden)]
+        self.costo = costos.tolist()
+
+    def costo_vendor(self, v, subtotal, lineas):
+        if lineas == 0:
+            return 0.0, 0.0
+        envio = self.shipping_cost[v] if subtotal < self.min_free_delivery[v] - _EPS else 0.0
+        faltante = max(self.min_purchase[v] - subtotal, 0.0)
+        return subtotal + envio, faltante if faltante > _EPS else 0.0
+
+    def evaluar(self, asignacion):
+        """(faltante total bajo los mínimos, costo total, envío total)"""
+        subtotal = [0.0] * self.n_vendors
+        lineas = [0] * self.n_vendors
+        for i, v in enumerate(asignacion):
+            subtotal[v] += self.costo[i][v]
+            lineas[v] += 1
+        return self._totales(subtotal, lineas)
+
+    def _totales(self, subtotal, lineas):
+        costo = faltante = envio = 0.0
+        for v in range(self.n_vendors):
+            c, f = self.costo_vendor(v, subtotal[v], lineas[v])
+            costo += c
+            faltante += f
+            envio += c - subtotal[v]
+        return faltante, costo, envio
+
+    def busqueda_local(self):
+        """
+        Parte de la oferta más barata por línea y aplica el mejor movimiento (mover
+        una línea o cerrar un vendor repartiendo sus líneas) mientras mejore
+        (primero el faltante bajo los mínimos, después el costo)
+        """
+        asignacion = [c[0] for c in self.candidatos]
+        subtotal = [0.0] * self.n_vendors
+        lineas = [0] * self.n_vendors
+        for i, v in enumerate(asignacion):
+            subtotal[v] += self.costo[i][v]
+            lineas[v] += 1
+        clave = self._totales(subtotal, lineas)[:2]
+
+        for _ in range(LIMITE_ITERACIONES):
+            mejor, mejor_clave = None, clave
+            for movimientos in self._movimientos(asignacion):
+                nuevo = self._clave_movimiento(subtotal, lineas, clave, movimientos)
+                if self._mejora(nuevo, mejor_clave):
+                    mejor, mejor_clave = movimientos, nuevo
+            if mejor is None:
+                break
+            clave = mejor_clave
+            for i, origen, destino in mejor:
+                asignacion[i] = destino
+                subtotal[origen] -= self.costo[i][origen]
+                subtotal[destino] += self.costo[i][destino]
+                lineas[origen] -= 1
+                lineas[destino] += 1
+        return asignacion
+
+    def _movimientos(self, asignacion):
+        """Movimientos candidatos como listas de (línea, vendor origen, vendor destino)"""
+        # Mover una línea a otro vendor que la ofrece
+        for i, origen in enumerate(asignacion):
+            for destino in self.candidatos[i]:
+                if destino != origen:
+                    yield [(i, origen, destino)]
+        # Cerrar un vendor: cada una de sus líneas a su alternativa más barata
+        for v in set(asignacion):
+            lineas_v = [i for i, origen in enumerate(asignacion) if origen == v]
+            alternativas = [[c for c in self.candidatos[i] if c != v] for i in lineas_v]
+            if len(lineas_v) > 1 and all(alternativas):
+                yield [(i, v, alt[0]) for i, alt in zip(lineas_v, alternativas)]
+
+    def _clave_movimiento(self, subtotal, lineas, clave, movimientos):
+        cambios_subtotal, cambios_lineas = {}, {}
+        for i, origen, destino in movimientos:
+            cambios_subtotal[origen] = cambios_subtotal.get(origen, subtotal[origen]) - self.costo[i][origen]
+            cambios_subtotal[destino] = cambios_subtotal.get(destino, subtotal[destino]) + self.costo[i][destino]
+            cambios_lineas[origen] = cambios_lineas.get(origen, lineas[origen]) - 1
+            cambios_lineas[destino] = cambios_lineas.get(destino, lineas[destino]) + 1
+        faltante, costo = clave
+        for v, nuevo_subtotal in cambios_subtotal.items():
+            costo_antes, faltante_antes = self.costo_vendor(v, subtotal[v], lineas[v])
+            costo_despues, faltante_despues = self.costo_vendor(v, nuevo_subtotal, cambios_lineas[v])
+            costo += costo_despues - costo_antes
+            faltante += faltante_despues - faltante_antes
+        return max(faltante, 0.0), costo
+
+    @staticmethod
+    def _mejora(nueva, actual):
+        if nueva[0] < actual[0] - _EPS:
+            return True
+        return abs(nueva[0] - actual[0]) <= _EPS and nueva[1] < actual[1] - _EPS
+
+    def branch_and_bound(self, incumbente):
+        """
+        Asignación factible de costo mínimo partiendo de incumbente. Poda por la cota
+        (costo parcial + la línea más barata de las que faltan + envíos que ya no
+        se pueden evitar) y por los mínimos que ya no se pueden alcanzar. Devuelve
+        (asignación, completo); completo es False si se agotó LIMITE_NODOS.
+        """
+        faltante, mejor_costo, _ = self.evaluar(incumbente)
+        if faltante > 0:
+            mejor_costo = np.inf
+        mejor = list(incumbente)
+
+        # Primero las líneas caras, que son las que más mueven la cota
+        minimo = np.where(np.isfinite(self.costos), self.costos, np.inf).min(axis=1)
+        orden = np.argsort(-minimo, kind='stable').tolist()
+        resto_minimo = np.concatenate([np.cumsum(minimo[orden][::-1])[::-1], [0.0]]).tolist()
+        maximo_vendor = np.where(np.isfinite(self.costos), self.costos, 0.0)[orden]
+        resto_vendor = np.vstack([np.cumsum(maximo_vendor[::-1], axis=0)[::-1],
+                                  np.zeros((1, self.n_vendors))]).tolist()
+
+        subtotal = [0.0] * self.n_vendors
+        lineas = [0] * self.n_vendors
+        asignacion = [0] * self.n_lineas
+        nodos = 0
+
+        def cota(k, parcial):
+            adicional = 0.0
+            for v in range(self.n_vendors):
+                if not lineas[v]:
+                    continue
+                alcanzable = subtotal[v] + resto_vendor[k][v]
+                if alcanzable < self.min_purchase[v] - _EPS:
+                    return np.inf
+                if alcanzable < self.min_free_delivery[v] - _EPS:
+                    adicional += self.shipping_cost[v]
+            return parcial + resto_minimo[k] + adicional
+
+        def explorar(k, parcial):
+            nonlocal nodos, mejor_costo, mejor
+            nodos += 1
+            if nodos > LIMITE_NODOS:
+                return False
+            if k == self.n_lineas:
+                costo = sum(self.costo_vendor(v, subtotal[v], lineas[v])[0] for v in range(self.n_vendors))
+                if costo < mejor_costo - _EPS:
+                    mejor_costo, mejor = costo, list(asignacion)
+                return True
+            i = orden[k]
+            for v in self.candidatos[i]:
+                c = self.costo[i][v]
+                subtotal[v] += c
+                lineas[v] += 1
+                asignacion[i] = v
+                if cota(k + 1, parcial + c) < mejor_costo - _EPS:
+                    if not explorar(k + 1, parcial + c):
+                        subtotal[v] -= c
+                        lineas[v] -= 1
+                        return False
+                subtotal[v] -= c
+                lineas[v] -= 1
+            return True
+
+        completo = explorar(0, 0.0)
+        return mejor, completo
+
+
+def optimizar_orden(costos, min_purchase, shipping_cost, min_free_delivery):
+    """
+    Asignación de las líneas (filas de costos, inf donde el vendor no ofrece la
+    línea) a vendors (columnas). Devuelve (asignación, costo_productos,
+    costo_envio, cumple_minimos, metodo).
+    """
+    canasta = _Canasta(costos, min_purchase, shipping_cost, min_free_delivery)
+    asignacion = canasta.busqueda_local()
+    metodo = 'heuristico'
+    if canasta.n_lineas <= LIMITE_EXACTO_LINEAS:
+        asignacion, completo = canasta.branch_and_bound(asignacion)
+        if completo:
+            metodo = 'exacto'
+
+    faltante, costo, envio = canasta.evaluar(asignacion)
+    return asignacion, costo - envio, envio, faltante <= 0, metodo
+
+
+def resolver_ordenes(ofertas):
+    """
+    Resuelve todas las órdenes de ofertas (ordenado por orden, salida de
+    ofertas_elegibles). Devuelve (resumen, asignación) sin el precio actual.
+    """
+    if ofertas.empty:
+        return pd.DataFrame(), pd.DataFrame()
+
+    pos = ofertas['point_of_sale_id'].to_numpy()
+    orden = ofertas['order_id'].to_numpy()
+    cortes = np.flatnonzero((pos[1:] != pos[:-1]) | (orden[1:] != orden[:-1])) + 1
+    inicios = np.concatenate([[0], cortes])
+    finales = np.concatenate([cortes, [len(ofertas)]])
+
+    productos = ofertas['super_catalog_id'].to_numpy()
+    vendors = ofertas['vendor_id'].to_numpy()
+    costo_linea = ofertas['costo_linea'].to_numpy(dtype=float)
+    terminos = ofertas[TERMINOS].to_numpy(dtype=float)
+
+    resumen, asignaciones = [], []
+    for inicio, fin in zip(inicios.tolist(), finales.tolist()):
+        codigo_linea, lineas = pd.factorize(productos[inicio:fin])
+        codigo_vendor, vendors_orden = pd.factorize(vendors[inicio:fin])
+        costos = np.full((len(lineas), len(vendors_orden)), np.inf)
+        costos[codigo_linea, codigo_vendor] = costo_linea[inicio:fin]
+        condiciones = np.zeros((len(vendors_orden), len(TERMINOS)))
+        condiciones[codigo_vendor] = terminos[inicio:fin]
+
+        asignacion, costo_productos, costo_envio, cumple, metodo = optimizar_orden(
+            costos, condiciones[:, 0], condiciones[:, 1], condiciones[:, 2])
+        linea_a_linea = _Canasta(costos, condiciones[:, 0], condiciones[:, 1], condiciones[:, 2])
+        _, costo_base, _ = linea_a_linea.evaluar([c[0] for c in linea_a_linea.candidatos])
+
+        resumen.append((pos[inicio], orden[inicio], len(lineas), len(set(asignacion)), costo_productos,
+                        costo_envio, costo_productos + costo_envio, costo_base, cumple, metodo))
+        asignaciones.append(pd.DataFrame({
+            'point_of_sale_id': pos[inicio],
+            'order_id': orden[inicio],
+            'super_catalog_id': lineas,
+            'vendor_id': vendors_orden[asignacion],
+            'costo_linea': costos[np.arange(len(lineas)), asignacion],
+        }))
+
+    df_resumen = pd.DataFrame(resumen, columns=['point_of_sale_id', 'order_id', 'lineas_cubiertas',
+                                                'vendors_usados', 'costo_productos', 'costo_envio', 'costo_total',
+                                                'costo_linea_a_linea', 'cumple_minimos', 'metodo'])
+    return df_resumen, pd.concat(asignaciones, ignore_index=True)
+
+
+def _repartir(ofertas, ordenes_por_tarea):
+    orden = ofertas.groupby(['point_of_sale_id', 'order_id'], sort=False).ngroup().to_numpy()
+    cortes = np.flatnonzero(np.diff(orden // ordenes_por_tarea)) + 1
+    limites = np.concatenate([[0], cortes, [len(ofertas)]])
+    return [ofertas.iloc[a:b] for a, b in zip(limites[:-1], limites[1:])]
+
+
+def optimizar_canastas(df_clasificado, condiciones, incluir_pendientes=False, procesos=1,
+                       ordenes_por_tarea=ORDENES_POR_TAREA):
+    """
+    Canasta óptima de cada orden de df_clasificado. Devuelve (resumen por orden,
+    asignación por línea) con COLUMNAS_RESUMEN y COLUMNAS_ASIGNACION. Las líneas sin
+    ofertas elegibles quedan fuera de la canasta (lineas_sin_oferta), las órdenes
+    sin ninguna no aparecen y el ahorro se mide contra el precio actual de las
+    líneas cubiertas. procesos=None usa uno por CPU.
+    """
+    ofertas, precio_actual = ofertas_elegibles(df_clasificado, condiciones, incluir_pendientes)
+    if ofertas.empty:
+        return pd.DataFrame(columns=COLUMNAS_RESUMEN), pd.DataFrame(columns=COLUMNAS_ASIGNACION)
+
+    tareas = _repartir(ofertas, ordenes_por_tarea)
+    procesos = procesos or os.cpu_count() or 1
+    if procesos == 1 or len(tareas) <= 1:
+        parciales = [resolver_ordenes(tarea) for tarea in tareas]
+    else:
+        with ProcessPoolExecutor(max_workers=procesos) as pool:
+            parciales = list(pool.map(resolver_ordenes, tareas))
+
+    resumen = pd.concat([r for r, _ in parciales], ignore_index=True)
+    asignacion = pd.concat([a for _, a in parciales], ignore_index=True)
+
+    claves = ['point_of_sale_id', 'order_id', 'super_catalog_id']
+    asignacion = asignacion.merge(precio_actual, on=claves, how='left')
+    actual = asignacion.groupby(['point_of_sale_id', 'order_id'], sort=False)['precio_actual'].sum(min_count=1)
+    lineas = precio_actual.groupby(['point_of_sale_id', 'order_id'], sort=False).size()
+
+    indice = pd.MultiIndex.from_frame(resumen[['point_of_sale_id', 'order_id']])
+    resumen['lineas'] = lineas.reindex(indice).to_numpy()
+    resumen['lineas_sin_oferta'] = resumen['lineas'] - resumen['lineas_cubiertas']
+    resumen['total_actual'] = actual.reindex(indice).to_numpy()
+    resumen['ahorro'] = resumen['total_actual'] - resumen['costo_total']
+    return resumen[COLUMNAS_RESUMEN], asignacion[COLUMNAS_ASIGNACION]
@@ -0,0 +1,201 @@
+"""
+Scoring batch de ahorro para todos los POS, sin Streamlit.
+
+Calcula los KPIs del dashboard ejecutivo, el análisis por vendor, el análisis por
+producto y las recomendaciones de cambio de vendor de toda la red, repartiendo
+los POS entre procesos, y escribe cada tabla en Parquet o CSV. Con --canastas
+agrega la canasta óptima de cada orden con compras mínimas y envíos.
+
+Uso:
+    python batch_scoring.py --salida resultados --procesos 8 --particion zona
+    python batch_scoring.py --salida resultados --canastas --incluir-pendientes
+"""
+import argparse
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import pandas as pd
+
+import pipeline
+from basket_optimizer import optimizar_canastas
+from landed_cost import condiciones_compra
+from pipeline import NOMBRES_FRAMES, cargar_datos
+from profiling import Perfil, configurar_logs_json, etapa
+from scoring_engine import (
+    IndicePOS,
+    IndiceStatus,
+    analizar_productos_pos,
+    analizar_vendors_pos,
+    columna_drogueria,
+    columna_vendor,
+    generar_recomendaciones_batch,
+    guardar_tabla,
+    kpis_ahorro_por_pos,
+)
+
+PARTICIONES = ['pos', 'zona']
+
+
+def analizar_lote(df_clasificado, df_vendors_pos):
+    """
+    Análisis por vendor y por producto de todos los POS de un lote, con una
+    columna point_of_sale_id al frente de cada tabla
+    """
+    indice = IndicePOS(df_clasificado)
+    indice_status = IndiceStatus(df_vendors_pos)
+    vendor_col = columna_vendor(df_clasificado)
+    drogueria_col = columna_drogueria(df_clasificado)
+
+    vendors, productos = [], []
+    for pos in indice.claves:
+        df_pos = indice.obtener(pos)
+
+        df_vendor_analysis = analizar_vendors_pos(df_pos, pos, indice_status, vendor_col)
+        if not df_vendor_analysis.empty:
+            vendors.append(df_vendor_analysis.assign(point_of_sale_id=pos))
+
+        df_producto_analysis = analizar_productos_pos(df_pos, vendor_col, drogueria_col)
+        if not df_producto_analysis.empty:
+            productos.append(df_producto_analysis.assign(point_of_sale_id=pos))
+
+    return _unir(vendors), _unir(productos)
+
+
+def _unir(tablas):
+    if not tablas:
+        return pd.DataFrame()
+    df = pd.concat(tablas, ignore_index=True)
+    return df[['point_of_sale_id'] + [col for col in df.columns if col != 'point_of_sale_id']]
+
+
+def _analizar_lote(args):
+    return analizar_lote(*args)
+
+
+def repartir_pos(df_clasificado, pos_geo_zones, n_lotes, particion='pos'):
+    """
+    Reparte los POS en a lo sumo n_lotes listas de tamaño (filas) parecido.
+    Con particion='zona' todos los POS de una geo_zone quedan en el mismo lote.
+    """
+    filas = df_clasificado.groupby('point_of_sale_id', sort=True).size()
+    if filas.empty:
+        return []
+
+    if particion == 'zona':
+        zonas = pos_geo_zones.drop_duplicates('point_of_sale_id').set_index('point_of_sale_id')['geo_zone']
+        grupo = zonas.reindex(filas.index).astype(object).fillna('Sin zona')
+    else:
+        grupo = pd.Series(filas.index, index=filas.index)
+
+    # Asignación greedy: el grupo más grande va al lote con menos filas
+    tamanos = filas.groupby(grupo.to_numpy()).sum().sort_values(ascending=False)
+    n_lotes = max(1, min(n_lotes, len(tamanos)))
+    cargas = [0] * n_lotes
+    lotes = [[] for _ in range(n_lotes)]
+    miembros = filas.index.to_series().groupby(grupo.to_numpy()).agg(list)
+
+    for clave, tamano in tamanos.items():
+        destino = cargas.index(min(cargas))
+        cargas[destino] += tamano
+        lotes[destino].extend(miembros[clave])
+
+    return [sorted(lote) for lote in lotes if lote]
+
+
+def scoring_red(frames, procesos=None, particion='pos', umbral_ahorro=0.1, lotes_por_proceso=4,
+                canastas=False, incluir_pendientes=False):
+    """
+    Tablas de scoring de toda la red a partir de los frames del pipeline.
+    Con canastas=True agrega la canasta óptima de cada orden (basket_optimizer).
+    Devuelve un dict nombre -> DataFrame.
+    """
+    _, _, _, df_min_purchase, _, pos_geo_zones, df_clasificado, df_vendors_pos, kpis_ahorro = frames
+    procesos = procesos or os.cpu_count() or 1
+
+    if kpis_ahorro.empty and not df_clasificado.empty:
+        kpis_ahorro = kpis_ahorro_por_pos(df_clasificado)
+
+    # KPIs y recomendaciones ya son vectorizados sobre toda la red
+    resultados = {
+        'kpis_ahorro': kpis_ahorro,
+        'recomendaciones': generar_recomendaciones_batch(df_clasificado, umbral_ahorro),
+    }
+
+    lotes = repartir_pos(df_clasificado, pos_geo_zones, procesos * lotes_por_proceso, particion)
+    indice = IndicePOS(df_clasificado)
+    tareas = []
+    for lote in lotes:
+        df_lote = pd.concat([indice.obtener(pos) for pos in lote], ignore_index=True)
+        relaciones = df_vendors_pos[df_vendors_pos['point_of_sale_id'].isin(lote)]
+        tareas.append((df_lote, relaciones))
+
+    if procesos == 1 or len(tareas) <= 1:
+        parciales = [analizar_lote(*tarea) for tarea in tareas]
+    else:
+        with ProcessPoolExecutor(max_workers=procesos) as pool:
+            parciales = list(pool.map(_analizar_lote, tareas))
+
+    resultados['analisis_vendors'] = _ordenar_por_pos(_unir([v for v, _ in parciales if not v.empty]))
+    resultados['analisis_productos'] = _ordenar_por_pos(_unir([p for _, p in parciales if not p.empty]))
+
+    if canastas:
+        with etapa('batch.canastas_optimas', df_clasificado):
+            resultados['canastas_optimas'], resultados['asignacion_canastas'] = optimizar_canastas(
+                df_clasificado, condiciones_compra(df_min_purchase), incluir_pendientes, procesos)
+    return resultados
+
+
+def _ordenar_por_pos(df):
+    if df.empty:
+        return df
+    return df.sort_values('point_of_sale_id', kind='stable', ignore_index=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--salida', default='resultados_scoring', help="Carpeta de salida")
+    parser.add_argument('--formato', choices=['parquet', 'csv'], default='parquet')
+    parser.add_argument('--procesos', type=int, default=None, help="Procesos (por defecto, uno por CPU)")
+    parser.add_argument('--particion', choices=PARTICIONES, default='pos',
+                        help="Repartir el trabajo por POS o por geo_zone")
+    parser.add_argument('--umbral', type=float, default=0.1,
+                        help="Ahorro relativo mínimo de las recomendaciones")
+    parser.add_argument('--canastas', action='store_true',
+                        help="Calcular la canasta óptima de cada orden con compras mínimas y envíos")
+    parser.add_argument('--incluir-pendientes', action='store_true',
+                        help="Permitir vendors con relación pendiente en las canastas óptimas")
+    parser.add_argument('--perfil', action='store_true', help="Mostrar el tiempo de cada etapa al terminar")
+    parser.add_argument('--log-perfil', default=None,
+                        help="Archivo donde escribir las etapas como líneas JSON ('-' para stderr)")
+    args = parser.parse_args()
+
+    if pipeline.BACKEND != 'pandas':
+        raise SystemExit("El scoring batch necesita las ofertas clasificadas en memoria: usar SCORING_BACKEND=pandas")
+
+    configurar_logs_json(args.log_perfil)
+    perfil = Perfil().activar()
+
+    inicio = time.perf_counter()
+    frames = cargar_datos()
+    if all(df.empty for df in frames):
+        raise SystemExit("El pipeline no devolvió datos")
+    print(f"Datos cargados en {time.perf_counter() - inicio:.1f} s")
+
+    inicio = time.perf_counter()
+    with etapa('batch.scoring_red', frames[NOMBRES_FRAMES.index('df_clasificado')]):
+        resultados = scoring_red(frames, args.procesos, args.particion, args.umbral,
+                                 canastas=args.canastas, incluir_pendientes=args.incluir_pendientes)
+    print(f"Scoring de la red en {time.perf_counter() - inicio:.1f} s")
+
+    os.makedirs(args.salida, exist_ok=True)
+    for nombre, df in resultados.items():
+        ruta = guardar_tabla(df, os.path.join(args.salida, f"{nombre}.{args.formato}"))
+        print(f"{nombre}: {len(df):,} filas -> {ruta}")
+
+    if args.perfil:
+        print("Etapas:\n" + perfil.resumen().to_string(index=False))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,74 @@
+"""
+Compara la clasificación vectorizada contra la implementación fila a fila.
+
+Uso:
+    python -m benchmarks.bench_clasificacion --filas 20000 --factores 1 10 100
+"""
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+
+from scoring_engine import clasificar_precios, clasificar_precios_iterativo
+
+
+def generar_ofertas(n_filas, seed=0):
+    """
+    Genera un frame con la forma de df_con_precios_minimos_local: varias ofertas
+    por (order_id, super_catalog_id), con empates y precios NaN
+    """
+    rng = np.random.default_rng(seed)
+    ofertas_por_linea = rng.integers(1, 6, size=max(1, n_filas // 3))
+    ofertas_por_linea = ofertas_por_linea[np.cumsum(ofertas_por_linea) <= n_filas]
+    n_lineas = len(ofertas_por_linea)
+
+    linea = np.repeat(np.arange(n_lineas), ofertas_por_linea)
+    order_id = 1000 + linea // 10
+    super_catalog_id = 7500000000000 + rng.integers(0, 5000, size=n_lineas)[linea]
+    precio_minimo = np.round(rng.uniform(10, 2000, size=n_lineas), 2)[linea]
+
+    # Precios en una rejilla gruesa para forzar empates
+    precio_vendedor = np.round(precio_minimo * rng.choice([0.8, 0.9, 1.0, 1.1, 1.2], size=len(linea)), 2)
+    precio_vendedor[rng.random(len(linea)) < 0.01] = np.nan
+    precio_minimo = precio_minimo.copy()
+    precio_minimo[rng.random(len(linea)) < 0.005] = np.nan
+
+    return pd.DataFrame({
+        'order_id': order_id,
+        'super_catalog_id': super_catalog_id,
+        'precio_minimo': precio_minimo,
+        'precio_vendedor': precio_vendedor,
+    })
+
+
+def medir(funcion, df):
+    inicio = time.perf_counter()
+    resultado = funcion(df)
+    return resultado, time.perf_counter() - inicio
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--filas', type=int, default=20000, help="Filas del tamaño base")
+    parser.add_argument('--factores', type=int, nargs='+', default=[1, 10, 100])
+    parser.add_argument('--max-filas-iterativo', type=int, default=None,
+                        help="No ejecutar la versión fila a fila por encima de este tamaño")
+    args = parser.parse_args()
+
+    print(f"{'filas':>10} {'iterativo (s)':>14} {'vectorizado (s)':>16} {'speedup':>9}  iguales")
+    for factor in args.factores:
+        df = generar_ofertas(args.filas * factor, seed=factor)
+        vectorizado, t_vectorizado = medir(clasificar_precios, df)
+
+        if args.max_filas_iterativo is not None and len(df) > args.max_filas_iterativo:
+            print(f"{len(df):>10} {'-':>14} {t_vectorizado:>16.3f} {'-':>9}  -")
+            continue
+
+        iterativo, t_iterativo = medir(clasificar_precios_iterativo, df)
+        iguales = iterativo['clasificacion'].equals(vectorizado['clasificacion'].astype(object))
+        print(f"{len(df):>10} {t_iterativo:>14.3f} {t_vectorizado:>16.3f} {t_iterativo / t_vectorizado:>8.0f}x  {iguales}")
+
+
+if __name__ == '__main__':
+    main()
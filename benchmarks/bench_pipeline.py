@@ -0,0 +1,189 @@
+"""
+Benchmark del pipeline completo sobre datos sintéticos reproducibles.
+
+Genera los CSV de entrada con benchmarks.datos_sinteticos y mide: el pipeline en
+frío (procesar_datos), la carga con caché en disco (cargar_datos, fallo y acierto),
+la clasificación, las recomendaciones de toda la red y las consultas de cada
+pestaña para una muestra de POS. Escribe los tiempos (el mínimo de las
+repeticiones) y el desglose por etapas en un JSON para comparar entre commits.
+
+Uso:
+    python -m benchmarks.bench_pipeline --pos 2000 --ordenes-por-pos 30 --salida bench.json
+    python -m benchmarks.bench_pipeline --salida nuevo.json --comparar bench.json
+"""
+import argparse
+import json
+import os
+import platform
+import shutil
+import subprocess
+import tempfile
+import time
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+import pipeline
+from benchmarks.datos_sinteticos import agregar_argumentos, generar_datos, parametros_de
+from disk_cache import DIRECTORIO_CACHE
+from profiling import Perfil
+from scoring_api import MotorScoring
+from scoring_engine import COLUMNAS_CLASIFICACION, clasificar_precios, generar_recomendaciones_batch
+
+CONSULTAS_POS = ['resumen_pos', 'detalle_compras', 'kpis', 'analisis_vendors', 'analisis_productos',
+                 'mejores_vendors', 'alternativas', 'recomendaciones', 'impacto_activacion', 'canasta_optima']
+
+
+def medir(funcion, repeticiones=1, antes=None):
+    """
+    Ejecuta funcion repeticiones veces (llamando antes() previo a cada una) y
+    devuelve el último resultado y el tiempo mínimo
+    """
+    tiempos = []
+    resultado = None
+    for _ in range(repeticiones):
+        if antes is not None:
+            antes()
+        inicio = time.perf_counter()
+        resultado = funcion()
+        tiempos.append(time.perf_counter() - inicio)
+    return resultado, min(tiempos)
+
+
+def _borrar_cache():
+    shutil.rmtree(DIRECTORIO_CACHE, ignore_errors=True)
+
+
+def _commit_git():
+    try:
+        raiz = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=raiz,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def ejecutar(parametros, repeticiones=3, muestra_pos=20, bloque=0, backend='pandas'):
+    """
+    Corre el benchmark en el directorio actual (que debe tener los CSV de entrada)
+    y devuelve un dict con los tiempos en segundos, las filas y el perfil por etapas
+    """
+    pipeline.BLOQUE_PEDIDOS = bloque
+    pipeline.BACKEND = backend
+    resultados = {}
+    perfil = Perfil()
+
+    with perfil.activo():
+        frames, resultados['procesar_datos'] = medir(pipeline.procesar_datos, repeticiones, antes=_borrar_cache)
+    if all(df.empty for df in frames):
+        raise SystemExit("El pipeline no devolvió datos")
+
+    _, resultados['cargar_datos_sin_cache'] = medir(pipeline.cargar_datos, 1, antes=_borrar_cache)
+    frames, resultados['cargar_datos_con_cache'] = medir(pipeline.cargar_datos, repeticiones)
+
+    df_clasificado = frames[pipeline.NOMBRES_FRAMES.index('df_clasificado')]
+    if backend == 'sqlite':
+        # Las mediciones de toda la red necesitan las ofertas en memoria
+        from sql_backend import conectar, leer_clasificado
+        with conectar() as con:
+            df_clasificado = leer_clasificado(con)
+    entrada_clasificacion = df_clasificado[COLUMNAS_CLASIFICACION]
+    _, resultados['clasificar_precios'] = medir(lambda: clasificar_precios(entrada_clasificacion), repeticiones)
+    _, resultados['recomendaciones_red'] = medir(lambda: generar_recomendaciones_batch(df_clasificado), repeticiones)
+
+    motor, resultados['indices_motor'] = medir(lambda: MotorScoring(frames), repeticiones)
+    pos_disponibles = motor.pos_disponibles
+    rng = np.random.default_rng(parametros['seed'])
+    muestra = rng.choice(pos_disponibles, size=min(muestra_pos, len(pos_disponibles)), replace=False)
+
+    # Consultas de la página: tiempo total sobre la muestra de POS
+    for consulta in CONSULTAS_POS:
+        metodo = getattr(motor, consulta)
+        _, resultados[f"pos.{consulta}"] = medir(lambda: [metodo(pos) for pos in muestra], repeticiones)
+
+    etapas = perfil.resumen()
+    etapas[['segundos', 'memoria_delta_mb']] /= repeticiones
+
+    return {
+        'fecha': datetime.now().isoformat(timespec='seconds'),
+        'commit': _commit_git(),
+        'python': platform.python_version(),
+        'pandas': pd.__version__,
+        'parametros': {**parametros, 'repeticiones': repeticiones, 'muestra_pos': len(muestra), 'bloque': bloque,
+                       'backend': backend},
+        'filas': {nombre: len(df) for nombre, df in zip(pipeline.NOMBRES_FRAMES, frames)},
+        'resultados': resultados,
+        'etapas': json.loads(etapas.to_json(orient='records')),
+    }
+
+
+def comparar(actual, anterior):
+    """
+    Tabla de tiempos actual vs anterior (ratio > 1 es más lento)
+    """
+    filas = []
+    for nombre, segundos in actual['resultados'].items():
+        previo = anterior['resultados'].get(nombre)
+        filas.append({
+            'medicion': nombre,
+            'anterior_s': previo,
+            'actual_s': segundos,
+            'ratio': segundos / previo if previo else None,
+        })
+    return pd.DataFrame(filas)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    agregar_argumentos(parser)
+    parser.add_argument('--repeticiones', type=int, default=3)
+    parser.add_argument('--muestra-pos', type=int, default=20, help="POS sobre los que medir las pestañas")
+    parser.add_argument('--bloque', type=int, default=0,
+                        help="Tamaño de bloque del modo streaming (0 = archivo completo)")
+    parser.add_argument('--backend', choices=pipeline.BACKENDS, default='pandas')
+    parser.add_argument('--directorio', default=None,
+                        help="Carpeta para los CSV generados (por defecto, una temporal que se borra)")
+    parser.add_argument('--salida', default='bench_pipeline.json', help="Archivo JSON de resultados")
+    parser.add_argument('--comparar', default=None, help="JSON de una corrida anterior")
+    args = parser.parse_args()
+
+    parametros = parametros_de(args)
+    salida = os.path.abspath(args.salida)
+    anterior = None
+    if args.comparar:
+        with open(args.comparar, encoding='utf-8') as f:
+            anterior = json.load(f)
+
+    temporal = args.directorio is None
+    directorio = tempfile.mkdtemp(prefix='bench_scoring_') if temporal else args.directorio
+    cwd = os.getcwd()
+    try:
+        inicio = time.perf_counter()
+        generar_datos(directorio, **parametros)
+        print(f"Datos generados en {time.perf_counter() - inicio:.1f} s ({directorio})")
+
+        # El pipeline lee los CSV y escribe la caché relativos al directorio actual
+        os.chdir(directorio)
+        reporte = ejecutar(parametros, args.repeticiones, args.muestra_pos, args.bloque, args.backend)
+    finally:
+        os.chdir(cwd)
+        if temporal:
+            shutil.rmtree(directorio, ignore_errors=True)
+
+    with open(salida, 'w', encoding='utf-8') as f:
+        json.dump(reporte, f, indent=2, ensure_ascii=False)
+
+    print("Filas: " + ", ".join(f"{nombre}={n:,}" for nombre, n in reporte['filas'].items()))
+    if anterior is not None:
+        if anterior.get('parametros') != reporte['parametros']:
+            print(f"Aviso: la corrida anterior usó otros parámetros: {anterior.get('parametros')}")
+        print(comparar(reporte, anterior).to_string(index=False, float_format='{:.3f}'.format))
+    else:
+        for nombre, segundos in reporte['resultados'].items():
+            print(f"{nombre:<28} {segundos:>9.3f} s")
+    print(f"Resultados en {salida}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,206 @@
+"""
+Generador determinista de los CSV de entrada del pipeline con los esquemas reales.
+
+POS, órdenes por POS, tamaño del catálogo y relaciones por POS escalan de forma
+independiente. El catálogo mantiene la separación entre ofertas nacionales
+('México') y regionales, y las direcciones usan tanto nombres completos como
+abreviaturas de estado.
+
+Uso:
+    python -m benchmarks.datos_sinteticos --directorio /tmp/datos --pos 5000 --ordenes-por-pos 50
+"""
+import argparse
+import os
+
+import numpy as np
+import pandas as pd
+
+# Zona regional del catálogo -> cómo puede aparecer en la dirección del POS
+ZONAS_REGIONALES = {
+    'Ciudad de México': ['Ciudad de México'],
+    'Estado de México': ['Estado de México'],
+    'Yucatán': ['Yucatán'],
+    'Jalisco': ['Jalisco', 'Jal.'],
+    'Guanajuato': ['Guanajuato', 'Gto.'],
+    'Querétaro': ['Querétaro', 'Qro.'],
+    'Hidalgo': ['Hidalgo', 'Hgo.'],
+    'Oaxaca': ['Oaxaca', 'Oax.'],
+    'Aguascalientes': ['Aguascalientes', 'Ags.'],
+    'Guerrero': ['Guerrero', 'Gro.'],
+}
+ZONA_NACIONAL = 'México'
+ZONA_SIN_ZONA = 'Sin Zona'
+
+PARAMETROS_DEFECTO = {
+    'pos': 500,
+    'ordenes_por_pos': 20,
+    'lineas_por_orden': 10,
+    'productos': 5000,
+    'ofertas_por_producto': 4,
+    'vendors': 20,
+    'relaciones_por_pos': 5,
+    'seed': 0,
+}
+
+ARCHIVOS = {
+    'pos_address': 'pos_address.csv',
+    'catalogo': 'vendors_catalog.csv',
+    'relaciones': 'vendor_pos_relations.csv',
+    'vendors_dm': 'vendors_dm.csv',
+    'minimum_purchase': 'minimum_purchase.csv',
+    'pedidos': 'orders_delivered_pos_vendor_geozone.csv',
+}
+
+
+def _pos(rng, n_pos):
+    zonas = np.array(list(ZONAS_REGIONALES))
+    zona_pos = zonas[rng.integers(0, len(zonas), size=n_pos)]
+    # Mitad de las direcciones con el nombre completo y mitad con la abreviatura
+    en_direccion = np.array([
+        ZONAS_REGIONALES[zona][i % len(ZONAS_REGIONALES[zona])]
+        for i, zona in enumerate(zona_pos)
+    ])
+    numero = rng.integers(1, 3000, size=n_pos)
+    colonia = rng.integers(1, 400, size=n_pos)
+
+    pos_ids = np.arange(1, n_pos + 1, dtype=np.int64)
+    direcciones = [
+        f"Calle {n} {c}, Colonia {c}, Municipio {c % 50}, {zona}, {ZONA_NACIONAL}"
+        for n, c, zona in zip(numero, colonia, en_direccion)
+    ]
+    return pd.DataFrame({'point_of_sale_id': pos_ids, 'address': direcciones, 'geo_zone': zona_pos})
+
+
+def _catalogo(rng, productos, ofertas_por_producto, vendors):
+    ofertas = np.maximum(1, rng.poisson(ofertas_por_producto, size=len(productos)))
+    super_catalog_id = np.repeat(productos, ofertas)
+    n = len(super_catalog_id)
+
+    zonas = np.array(list(ZONAS_REGIONALES))
+    zona = np.where(rng.random(n) < 0.35, ZONA_NACIONAL,
+                    np.where(rng.random(n) < 0.15, ZONA_SIN_ZONA, zonas[rng.integers(0, len(zonas), size=n)]))
+
+    precio_referencia = np.round(np.exp(rng.normal(3.9, 1.2, size=len(productos))), 2)
+    base_price = np.round(np.repeat(precio_referencia, ofertas) * rng.uniform(0.85, 1.25, size=n), 4)
+    percentage = np.where(rng.random(n) < 0.6, 0.0, np.round(rng.uniform(0, 15, size=n), 2))
+    percentage[rng.random(n) < 1 / 3] = np.nan
+
+    catalogo = pd.DataFrame({
+        'vendor_id': vendors[rng.integers(0, len(vendors), size=n)],
+        'super_catalog_id': super_catalog_id,
+        'name': zona,
+        'base_price': base_price,
+        'percentage': percentage,
+    })
+    return catalogo.drop_duplicates(['vendor_id', 'super_catalog_id', 'name'], ignore_index=True), precio_referencia
+
+
+def _relaciones(rng, pos_ids, vendors, relaciones_por_pos):
+    n_rel = np.minimum(len(vendors), np.maximum(1, rng.poisson(relaciones_por_pos, size=len(pos_ids))))
+    pos = np.repeat(pos_ids, n_rel)
+    vendor = np.concatenate([rng.choice(vendors, size=k, replace=False) for k in n_rel])
+    status = rng.choice([1, 0, 2], size=len(pos), p=[0.73, 0.17, 0.10])
+    return pd.DataFrame({'point_of_sale_id': pos, 'vendor_id': vendor, 'status': status})
+
+
+def _pedidos(rng, pos_ids, productos, precio_referencia, ordenes_por_pos, lineas_por_orden, droguerias):
+    n_ordenes = len(pos_ids) * ordenes_por_pos
+    order_id = np.arange(1001, 1001 + n_ordenes, dtype=np.int64)
+    pos_orden = np.repeat(pos_ids, ordenes_por_pos)
+    drogueria_orden = droguerias[rng.integers(0, len(droguerias), size=n_ordenes)]
+
+    # Las líneas de una orden son contiguas, como en la exportación real
+    linea_orden = np.repeat(np.arange(n_ordenes), lineas_por_orden)
+    producto = rng.integers(0, len(productos), size=len(linea_orden))
+    unidades = rng.integers(0, 20, size=len(linea_orden))
+    precio = np.round(precio_referencia[producto] * rng.uniform(0.8, 1.3, size=len(linea_orden)), 2)
+
+    return pd.DataFrame({
+        'order_id': order_id[linea_orden],
+        'point_of_sale_id': pos_orden[linea_orden],
+        'vendor_id': drogueria_orden[linea_orden],
+        'super_catalog_id': productos[producto],
+        'unidades_pedidas': unidades,
+        'precio_minimo': precio,
+        'valor_vendedor': np.round(unidades * precio, 2),
+        'country': ZONA_NACIONAL,
+        'geo_zone': 'x',
+    })
+
+
+def _minimum_purchase(rng, vendors):
+    zonas = [ZONA_NACIONAL] + list(ZONAS_REGIONALES)
+    filas = [(v, z) for v in vendors for z in zonas if rng.random() < 0.5]
+    n = len(filas)
+    return pd.DataFrame({
+        'id': np.arange(1, n + 1),
+        'vendor_id': [v for v, _ in filas],
+        'name': [z for _, z in filas],
+        'min_purchase': np.round(rng.choice([0, 500, 1000, 2500], size=n), 2),
+        'shipping_cost': np.round(rng.choice([0, 99, 150], size=n), 2),
+        'min_free_delivery': np.round(rng.choice([0, 1500, 3000], size=n), 2),
+        'created_at': '2024-09-13 19:06:01',
+        'updated_at': '2024-09-13 19:06:01',
+        'deleted_at': np.where(rng.random(n) < 0.05, '2025-01-01 00:00:00', None),
+    })
+
+
+def generar_datos(directorio, **parametros):
+    """
+    Escribe los seis CSV de entrada en directorio y devuelve sus rutas. Los mismos
+    parámetros (incluida la semilla) generan siempre los mismos archivos.
+    """
+    p = {**PARAMETROS_DEFECTO, **parametros}
+    rng = np.random.default_rng(p['seed'])
+    os.makedirs(directorio, exist_ok=True)
+
+    vendors = np.arange(2001, 2001 + p['vendors'], dtype=np.int64)
+    droguerias = np.arange(10249, 10249 + max(2, p['vendors'] // 4), dtype=np.int64)
+    productos = 7500000000000 + rng.choice(10 * p['productos'], size=p['productos'], replace=False)
+
+    df_pos = _pos(rng, p['pos'])
+    catalogo, precio_referencia = _catalogo(rng, productos, p['ofertas_por_producto'], vendors)
+    tablas = {
+        'pos_address': df_pos,
+        'catalogo': catalogo,
+        'relaciones': _relaciones(rng, df_pos['point_of_sale_id'].to_numpy(), vendors, p['relaciones_por_pos']),
+        'vendors_dm': pd.DataFrame({
+            'vendor_id': vendors,
+            'name': [f"Vendor {v}" for v in vendors],
+            'drug_manufacturer_id': droguerias[np.arange(len(vendors)) % len(droguerias)],
+        }),
+        'minimum_purchase': _minimum_purchase(rng, vendors),
+        'pedidos': _pedidos(rng, df_pos['point_of_sale_id'].to_numpy(), productos, precio_referencia,
+                            p['ordenes_por_pos'], p['lineas_por_orden'], droguerias),
+    }
+
+    rutas = {}
+    for nombre, df in tablas.items():
+        rutas[nombre] = os.path.join(directorio, ARCHIVOS[nombre])
+        df.to_csv(rutas[nombre], index=False)
+    return rutas
+
+
+def agregar_argumentos(parser):
+    """Argumentos de escala del generador (compartidos con la suite de benchmarks)"""
+    for nombre, valor in PARAMETROS_DEFECTO.items():
+        parser.add_argument(f"--{nombre.replace('_', '-')}", type=int, default=valor, dest=nombre)
+
+
+def parametros_de(args):
+    return {nombre: getattr(args, nombre) for nombre in PARAMETROS_DEFECTO}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--directorio', required=True, help="Carpeta donde escribir los CSV")
+    agregar_argumentos(parser)
+    args = parser.parse_args()
+
+    rutas = generar_datos(args.directorio, **parametros_de(args))
+    for nombre, ruta in rutas.items():
+        print(f"{nombre}: {ruta} ({os.path.getsize(ruta) / 1024 ** 2:.1f} MB)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,126 @@
+"""
+Índice de precios del catálogo de vendors: precio efectivo por oferta y mejores
+precios por (super_catalog_id, zona) con las ofertas nacionales incluidas
+"""
+import numpy as np
+import pandas as pd
+
+ZONA_NACIONAL = 'México'
+
+COLUMNAS_REFERENCIA = ['super_catalog_id', 'zona', 'precio_min', 'vendor_min', 'precio_segundo', 'ofertas']
+
+
+def precio_efectivo(base_price, percentage):
+    """
+    Precio unitario del vendor: base_price más el porcentaje de recargo
+    """
+    base_price = base_price.astype(float)
+    return base_price + (base_price * percentage.astype(float) / 100)
+
+
+def _mejores_dos(ofertas, claves):
+    """
+    Mínimo, vendor del mínimo, segundo mínimo y número de ofertas por clave
+    """
+    ordenadas = ofertas.sort_values(claves + ['precio_vendedor', 'vendor_id'], kind='stable')
+    posicion = ordenadas.groupby(claves, sort=False).cumcount()
+
+    primeras = ordenadas[posicion == 0].set_index(claves)
+    segundas = ordenadas[posicion == 1].set_index(claves)['precio_vendedor']
+
+    referencia = pd.DataFrame({
+        'precio_min': primeras['precio_vendedor'],
+        'vendor_min': primeras['vendor_id'],
+    })
+    referencia['precio_segundo'] = segundas.reindex(referencia.index)
+    referencia['ofertas'] = ordenadas.groupby(claves, sort=False).size().reindex(referencia.index)
+    return referencia.reset_index()
+
+
+class IndiceCatalogo:
+    """
+    Catálogo con precio_vendedor calculado una sola vez por oferta y separado en
+    ofertas nacionales ('México') y regionales. Las líneas de pedido obtienen sus
+    ofertas candidatas con ofertas_para y el mejor precio de su producto y zona
+    (regional o, si no hay, nacional) con precios_referencia.
+    """
+
+    def __init__(self, df_proveedores):
+        catalogo = df_proveedores.copy()
+        catalogo['percentage'] = catalogo['percentage'].fillna(0).astype(float)
+        catalogo['base_price'] = catalogo['base_price'].astype(float)
+        catalogo['precio_vendedor'] = precio_efectivo(catalogo['base_price'], catalogo['percentage'])
+
+        es_nacional = catalogo['name'] == ZONA_NACIONAL
+        self.nacional = catalogo[es_nacional].reset_index(drop=True)
+        self.regional = catalogo[~es_nacional].reset_index(drop=True)
+        self.referencia = self._construir_referencia()
+
+    @property
+    def empty(self):
+        return self.nacional.empty and self.regional.empty
+
+    def __len__(self):
+        return len(self.nacional) + len(self.regional)
+
+    def _construir_referencia(self):
+        columnas = ['super_catalog_id', 'vendor_id', 'precio_vendedor']
+        nacional = self.nacional[columnas].assign(zona=ZONA_NACIONAL)
+        regional = self.regional[columnas].assign(zona=self.regional['name'].astype(str))
+
+        # Cada zona regional compite también con las ofertas nacionales de su producto
+        zonas = regional[['super_catalog_id', 'zona']].drop_duplicates()
+        nacional_en_zonas = zonas.merge(self.nacional[columnas], on='super_catalog_id', how='inner')
+
+        ofertas = pd.concat([regional, nacional_en_zonas, nacional], ignore_index=True)
+        if ofertas.empty:
+            return pd.DataFrame(columns=COLUMNAS_REFERENCIA)
+
+        referencia = _mejores_dos(ofertas, ['super_catalog_id', 'zona'])
+        referencia['zona'] = referencia['zona'].astype('category')
+        return referencia[COLUMNAS_REFERENCIA]
+
+    def ofertas_para(self, df_lineas, columna_zona='geo_zone'):
+        """
+        Ofertas candidatas de cada línea de pedido: las nacionales de su producto
+        y las regionales de su zona, con precio_vendedor ya calculado
+        """
+        ofertas_nacionales = pd.merge(df_lineas, self.nacional, on='super_catalog_id', how='inner')
+        ofertas_regionales = pd.merge(
+            df_lineas, self.regional,
+            left_on=['super_catalog_id', columna_zona], right_on=['super_catalog_id', 'name'],
+            how='inner'
+        )
+
+        partes = [df for df in (ofertas_regionales, ofertas_nacionales) if not df.empty]
+        if not partes:
+            return ofertas_nacionales
+        return pd.concat(partes, axis=0, ignore_index=True)
+
+    def precios_referencia(self, super_catalog_ids, zonas):
+        """
+        Mejor precio, su vendor, segundo mejor precio y número de ofertas para cada
+        par (producto, zona); las zonas sin ofertas regionales usan las nacionales.
+        Devuelve un DataFrame alineado con las entradas.
+        """
+        consulta = pd.DataFrame({
+            'super_catalog_id': np.asarray(super_catalog_ids),
+            'zona': pd.Series(zonas, dtype=object).astype(str).to_numpy(),
+        })
+        referencia = self.referencia.assign(zona=self.referencia['zona'].astype(str))
+        valores = ['precio_min', 'vendor_min', 'precio_segundo', 'ofertas']
+
+        resultado = consulta.merge(referencia, on=['super_catalog_id', 'zona'], how='left')
+        sin_zona = resultado['precio_min'].isna().to_numpy()
+        if sin_zona.any():
+            nacional = referencia[referencia['zona'] == ZONA_NACIONAL].drop(columns='zona')
+            respaldo = consulta.loc[sin_zona, ['super_catalog_id']].merge(nacional, on='super_catalog_id', how='left')
+            resultado.loc[sin_zona, valores] = respaldo[valores].to_numpy()
+
+        return resultado[valores]
+
+    def mejor_precio(self, super_catalog_id, zona):
+        """
+        Mejor precio unitario de un producto en una zona (NaN si no hay ofertas)
+        """
+        return self.precios_referencia([super_catalog_id], [zona])['precio_min'].iloc[0]
@@ -0,0 +1,89 @@
+"""
+Caché persistente en disco (Parquet) de los frames procesados por el pipeline
+"""
+import hashlib
+import os
+import shutil
+import uuid
+
+import pandas as pd
+
+DIRECTORIO_CACHE = '.cache_scoring'
+
+
+def huella_entradas(rutas, version, contenido=False):
+    """
+    Huella de los archivos de entrada y de la versión del pipeline.
+
+    Por defecto usa tamaño y fecha de modificación de cada archivo; con
+    contenido=True usa un hash del contenido (más lento, pero estable ante
+    copias que no conservan la fecha). Los archivos inexistentes también
+    forman parte de la huella.
+    """
+    h = hashlib.sha256(f"pipeline={version}".encode())
+
+    for ruta in rutas:
+        h.update(f"|{ruta}=".encode())
+        if not os.path.exists(ruta):
+            h.update(b"missing")
+            continue
+
+        if contenido:
+            with open(ruta, 'rb') as f:
+                for bloque in iter(lambda: f.read(1 << 20), b''):
+                    h.update(bloque)
+        else:
+            stat = os.stat(ruta)
+            h.update(f"{stat.st_size}:{stat.st_mtime_ns}".encode())
+
+    return h.hexdigest()[:16]
+
+
+def cargar_frames(huella, nombres, directorio=DIRECTORIO_CACHE):
+    """
+    Lee los frames guardados para la huella indicada, o None si no están en caché
+    """
+    carpeta = os.path.join(directorio, huella)
+    rutas = [os.path.join(carpeta, f"{nombre}.parquet") for nombre in nombres]
+
+    if not all(os.path.exists(ruta) for ruta in rutas):
+        return None
+
+    try:
+        return tuple(pd.read_parquet(ruta) for ruta in rutas)
+    except Exception as e:
+        print(f"Error al leer la caché {carpeta}: {e}")
+        return None
+
+
+def guardar_frames(huella, nombres, frames, directorio=DIRECTORIO_CACHE):
+    """
+    Guarda los frames para la huella indicada y elimina las huellas anteriores.
+    La escritura se hace en una carpeta temporal que se renombra al terminar,
+    así un proceso concurrente nunca lee una caché a medio escribir.
+    """
+    carpeta = os.path.join(directorio, huella)
+    temporal = os.path.join(directorio, f".tmp-{huella}-{uuid.uuid4().hex[:8]}")
+
+    try:
+        os.makedirs(temporal)
+        for nombre, df in zip(nombres, frames):
+            df.to_parquet(os.path.join(temporal, f"{nombre}.parquet"))
+
+        if os.path.exists(carpeta):
+            shutil.rmtree(temporal)
+        else:
+            os.rename(temporal, carpeta)
+    except Exception as e:
+        print(f"Error al guardar la caché {carpeta}: {e}")
+        shutil.rmtree(temporal, ignore_errors=True)
+        return False
+
+    # Solo se borran carpetas de huellas anteriores; los archivos sueltos (como el
+    # lookup de zonas) se conservan
+    for entrada in os.listdir(directorio):
+        ruta = os.path.join(directorio, entrada)
+        if entrada != huella and not entrada.startswith('.tmp-') and os.path.isdir(ruta):
+            shutil.rmtree(ruta, ignore_errors=True)
+
+    return True
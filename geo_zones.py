@@ -0,0 +1,108 @@
+"""
+Resolución de la zona geográfica de cada POS a partir de su dirección, con un
+lookup persistente point_of_sale_id -> geo_zone
+"""
+import hashlib
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+from disk_cache import DIRECTORIO_CACHE
+
+ABREVIATURAS_ZONAS = {
+    'B.C.S.': 'Baja California Sur', 'Qro.': 'Querétaro', 'Jal.': 'Jalisco',
+    'Pue.': 'Puebla', 'Méx.': 'CDMX', 'Oax.': 'Oaxaca', 'Chih.': 'Chihuahua',
+    'Coah.': 'Coahuila de Zaragoza', 'Mich.': 'Michoacán de Ocampo',
+    'Ver.': 'Veracruz de Ignacio de la Llave', 'Chis.': 'Chiapas',
+    'N.L.': 'Nuevo León', 'Hgo.': 'Hidalgo', 'Tlax.': 'Tlaxcala',
+    'Tamps.': 'Tamaulipas', 'Yuc.': 'Yucatan', 'Mor.': 'Morelos',
+    'Sin.': 'Sinaloa', 'S.L.P.': 'San Luis Potosí', 'Q.R.': 'Quintana Roo',
+    'Dgo.': 'Durango', 'B.C.': 'Baja California', 'Gto.': 'Guanajuato',
+    'Camp.': 'Campeche', 'Tab.': 'Tabasco', 'Son.': 'Sonora',
+    'Gro.': 'Guerrero', 'Zac.': 'Zacatecas', 'Ags.': 'Aguascalientes',
+    'Nay.': 'Nayarit'
+}
+
+# El lookup guardado depende del mapa de abreviaturas: si cambia, se recalcula todo
+_VERSION_ZONAS = hashlib.sha256(json.dumps(ABREVIATURAS_ZONAS, sort_keys=True).encode()).hexdigest()[:8]
+RUTA_LOOKUP_ZONAS = os.path.join(DIRECTORIO_CACHE, f"pos_geo_zones-{_VERSION_ZONAS}.parquet")
+
+
+def obtener_geo_zone(address):
+    """
+    Extrae la zona geográfica de una dirección
+    """
+    partes = address.split(', ')
+    return ', '.join(partes[-2:-1])
+
+
+def extraer_zonas(direcciones):
+    """
+    Zona normalizada (anteúltimo tramo de la dirección, sin abreviaturas) de cada
+    dirección, como categórica. Cada dirección distinta se procesa una sola vez.
+    """
+    direcciones = pd.Series(direcciones, dtype=object)
+    codigos, unicas = pd.factorize(direcciones)
+
+    partes = pd.Series(unicas, dtype=object).str.rsplit(', ', n=2, expand=True)
+    partes = partes.reindex(columns=[0, 1, 2])
+    zonas = np.where(partes[2].notna(), partes[1],
+                     np.where(partes[1].notna(), partes[0], ''))
+    zonas = pd.Series(zonas, dtype=object).replace(ABREVIATURAS_ZONAS)
+
+    categorias = pd.Index(zonas.dropna().unique())
+    codigos_zona = categorias.get_indexer(zonas)
+    # Las direcciones nulas (código -1 de factorize) quedan sin zona
+    codigos_zona = np.where(codigos >= 0, codigos_zona[codigos], -1)
+    return pd.Series(pd.Categorical.from_codes(codigos_zona, categories=categorias),
+                     index=direcciones.index, name='geo_zone')
+
+
+def _leer_lookup(ruta):
+    if ruta is None or not os.path.exists(ruta):
+        return None
+    try:
+        return pd.read_parquet(ruta)
+    except Exception as e:
+        print(f"Error al leer el lookup de zonas {ruta}: {e}")
+        return None
+
+
+def zonas_pos(df_pos_address, ruta=RUTA_LOOKUP_ZONAS):
+    """
+    point_of_sale_id -> geo_zone categórica. Con un lookup guardado en ruta solo
+    se procesan los POS nuevos o cuya dirección cambió, y el lookup se actualiza.
+    Con ruta=None no se lee ni escribe nada.
+    """
+    actuales = df_pos_address[['point_of_sale_id', 'address']].reset_index(drop=True)
+    anterior = _leer_lookup(ruta)
+
+    if anterior is None:
+        pendientes = np.ones(len(actuales), dtype=bool)
+        zonas = pd.Series([None] * len(actuales), dtype=object)
+    else:
+        anterior = anterior.drop_duplicates('point_of_sale_id', keep='last')
+        cruce = actuales.merge(anterior, on='point_of_sale_id', how='left', suffixes=('', '_anterior'))
+        pendientes = (cruce['address'] != cruce['address_anterior']).to_numpy()
+        zonas = cruce['geo_zone'].astype(object)
+
+    if pendientes.any():
+        zonas = zonas.copy()
+        zonas[pendientes] = extraer_zonas(actuales.loc[pendientes, 'address']).astype(object).to_numpy()
+
+    pos_geo_zones = pd.DataFrame({
+        'point_of_sale_id': actuales['point_of_sale_id'],
+        'geo_zone': zonas.astype('category'),
+    })
+
+    if ruta is not None and pendientes.any():
+        os.makedirs(os.path.dirname(ruta) or '.', exist_ok=True)
+        lookup = actuales.assign(geo_zone=pos_geo_zones['geo_zone'])
+        temporal = f"{ruta}.tmp-{os.getpid()}"
+        lookup.to_parquet(temporal, index=False)
+        os.replace(temporal, ruta)
+        print(f"Zonas geográficas: {int(pendientes.sum()):,} de {len(actuales):,} POS procesados")
+
+    return pos_geo_zones
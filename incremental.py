@@ -0,0 +1,343 @@
+"""
+Actualización incremental (SCORING_INCREMENTAL=1) a partir de los frames de la
+corrida anterior guardados en la caché en disco:
+
+- Pedidos: se cruzan y clasifican únicamente las órdenes nuevas o modificadas y
+  se recalculan los agregados de los POS afectados.
+- Catálogo: se compara el catálogo nuevo con el snapshot anterior por
+  (vendor_id, super_catalog_id, name) y se reclasifican solo las líneas de
+  pedido (order_id, super_catalog_id) cuyas ofertas cambiaron, con un reporte
+  del cambio de ahorro de cada POS afectado.
+
+Los archivos se siguen leyendo completos para detectar los cambios, pero el cruce
+con el catálogo y la clasificación, que son lo caro, escalan con lo que cambió.
+"""
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+from catalog_index import IndiceCatalogo, ZONA_NACIONAL
+from disk_cache import DIRECTORIO_CACHE, cargar_frames, huella_entradas
+from landed_cost import COLUMNAS_COSTO_PUESTO, agregar_costo_puesto, condiciones_compra
+from pipeline import (
+    ARCHIVO_CATALOGO,
+    ARCHIVO_PEDIDOS,
+    ARCHIVOS_ENTRADA,
+    NOMBRES_FRAMES,
+    PIPELINE_VERSION,
+    clasificar_pedidos,
+    concatenar_bloques,
+    estadisticas_pedidos,
+    huella_catalogo,
+)
+from profiling import etapa
+from schemas import leer_csv_tipado
+from scoring_engine import kpis_ahorro_por_pos
+
+RUTA_ESTADO = os.path.join(DIRECTORIO_CACHE, 'ordenes_procesadas.parquet')
+RUTA_META_ESTADO = os.path.join(DIRECTORIO_CACHE, 'ordenes_procesadas.json')
+RUTA_SNAPSHOT_CATALOGO = os.path.join(DIRECTORIO_CACHE, 'catalogo_anterior.parquet')
+RUTA_REPORTE_CATALOGO = os.path.join(DIRECTORIO_CACHE, 'cambios_catalogo.parquet')
+
+CLAVES_OFERTA = ['vendor_id', 'super_catalog_id', 'name']
+COLUMNAS_REPORTE = ['point_of_sale_id', 'lineas_afectadas', 'total_optimo_anterior', 'total_optimo',
+                    'ahorro_maximo_anterior', 'ahorro_maximo', 'diferencia_ahorro']
+
+# Zona de las líneas cuyo POS no tiene geo_zone (las ofertas sin name se cruzan con ellas)
+_SIN_ZONA = '\0sin zona'
+
+
+def huella_entradas_base():
+    """
+    Huella de las entradas que no se actualizan de forma incremental (todas salvo
+    pedidos y catálogo): si cambia, los frames anteriores no sirven como punto de partida
+    """
+    return huella_entradas(
+        [ruta for ruta in ARCHIVOS_ENTRADA if ruta not in (ARCHIVO_PEDIDOS, ARCHIVO_CATALOGO)], PIPELINE_VERSION
+    )
+
+
+def huellas_ordenes(df_pedidos):
+    """
+    Una huella por order_id (con su POS) a partir del contenido y la posición de
+    sus líneas: cambia si se agrega, quita, modifica o reordena una línea
+    """
+    if df_pedidos.empty:
+        return pd.DataFrame({'order_id': pd.Series(dtype='int64'), 'point_of_sale_id': pd.Series(dtype='int64'),
+                             'huella': pd.Series(dtype='uint64')})
+
+    lineas = df_pedidos.assign(linea=df_pedidos.groupby('order_id', sort=False).cumcount())
+    por_linea = pd.util.hash_pandas_object(lineas, index=False)
+    with np.errstate(over='ignore'):
+        huellas = por_linea.groupby(df_pedidos['order_id'].to_numpy()).sum()
+    pos = df_pedidos.groupby('order_id', sort=True)['point_of_sale_id'].first()
+
+    return pd.DataFrame({
+        'order_id': huellas.index.to_numpy(),
+        'point_of_sale_id': pos.reindex(huellas.index).to_numpy(),
+        'huella': huellas.to_numpy(dtype='uint64'),
+    })
+
+
+def leer_estado():
+    """
+    Huellas de las órdenes ya procesadas y metadatos de la corrida (None si no hay)
+    """
+    if not (os.path.exists(RUTA_ESTADO) and os.path.exists(RUTA_META_ESTADO)):
+        return None
+    try:
+        with open(RUTA_META_ESTADO, encoding='utf-8') as f:
+            meta = json.load(f)
+        return pd.read_parquet(RUTA_ESTADO), meta
+    except Exception as e:
+        print(f"Error al leer el estado incremental: {e}")
+        return None
+
+
+def _escribir_atomico(df, ruta):
+    temporal = f"{ruta}.tmp-{os.getpid()}"
+    df.to_parquet(temporal, index=False)
+    os.replace(temporal, ruta)
+
+
+def guardar_estado(huella_frames, df_pedidos):
+    """
+    Guarda las huellas de las órdenes de df_pedidos y un snapshot del catálogo,
+    asociados a los frames guardados en la caché con huella_frames
+    """
+    try:
+        os.makedirs(DIRECTORIO_CACHE, exist_ok=True)
+        _escribir_atomico(huellas_ordenes(df_pedidos), RUTA_ESTADO)
+        _escribir_atomico(leer_csv_tipado(ARCHIVO_CATALOGO), RUTA_SNAPSHOT_CATALOGO)
+
+        meta = {
+            'huella_frames': huella_frames,
+            'huella_base': huella_entradas_base(),
+            'huella_catalogo': huella_catalogo(),
+        }
+        temporal = f"{RUTA_META_ESTADO}.tmp-{os.getpid()}"
+        with open(temporal, 'w', encoding='utf-8') as f:
+            json.dump(meta, f)
+        os.replace(temporal, RUTA_META_ESTADO)
+    except Exception as e:
+        print(f"Error al guardar el estado incremental: {e}")
+
+
+def ordenes_cambiadas(anteriores, actuales):
+    """
+    order_id nuevos, modificados o eliminados y los POS a los que pertenecen
+    (antes o después del cambio)
+    """
+    cruce = anteriores.merge(actuales, on='order_id', how='outer', suffixes=('_anterior', ''), indicator=True)
+    cambiadas = cruce[(cruce['_merge'] != 'both') | (cruce['huella'] != cruce['huella_anterior'])]
+
+    pos = pd.concat([cambiadas['point_of_sale_id'], cambiadas['point_of_sale_id_anterior']]).dropna()
+    return set(cambiadas['order_id'].tolist()), set(pos.astype('int64').tolist())
+
+
+def _con_ocurrencia(catalogo):
+    ofertas = catalogo[CLAVES_OFERTA + ['base_price', 'percentage']].copy()
+    ofertas['name'] = ofertas['name'].astype(object)
+    # El catálogo repite claves: la n-ésima aparición se compara con la n-ésima anterior
+    ofertas['ocurrencia'] = ofertas.groupby(CLAVES_OFERTA, dropna=False, sort=False).cumcount()
+    return ofertas
+
+
+def ofertas_cambiadas(anterior, actual):
+    """
+    Ofertas agregadas, eliminadas o con otro base_price/percentage entre dos
+    versiones del catálogo, por (vendor_id, super_catalog_id, name)
+    """
+    cruce = _con_ocurrencia(anterior).merge(
+        _con_ocurrencia(actual), on=CLAVES_OFERTA + ['ocurrencia'], how='outer',
+        suffixes=('_anterior', ''), indicator=True
+    )
+
+    def distinto(columna):
+        a, b = cruce[f"{columna}_anterior"], cruce[columna]
+        return ~((a == b) | (a.isna() & b.isna()))
+
+    cambiadas = cruce[(cruce['_merge'] != 'both') | distinto('base_price') | distinto('percentage')]
+    return cambiadas[CLAVES_OFERTA + ['base_price_anterior', 'base_price', 'percentage_anterior', 'percentage']]
+
+
+def lineas_afectadas(df_pedidos, pos_geo_zones, ofertas):
+    """
+    Líneas de pedido (order_id, super_catalog_id, point_of_sale_id) con alguna
+    oferta cambiada: las nacionales afectan al producto en todas las zonas y las
+    regionales solo a los POS de su zona
+    """
+    columnas = ['order_id', 'super_catalog_id', 'point_of_sale_id']
+    if ofertas.empty or df_pedidos.empty:
+        return pd.DataFrame(columns=columnas)
+
+    es_nacional = ofertas['name'] == ZONA_NACIONAL
+    productos_nacionales = ofertas.loc[es_nacional, 'super_catalog_id'].unique()
+    zonas_regionales = (ofertas.loc[~es_nacional, ['super_catalog_id', 'name']]
+                        .fillna({'name': _SIN_ZONA})
+                        .rename(columns={'name': 'zona'})
+                        .drop_duplicates())
+
+    lineas = df_pedidos[columnas].drop_duplicates()
+    zonas = pos_geo_zones[['point_of_sale_id', 'geo_zone']].assign(
+        zona=pos_geo_zones['geo_zone'].astype(object).fillna(_SIN_ZONA)).drop(columns='geo_zone')
+    lineas = lineas.merge(zonas, on='point_of_sale_id', how='left').fillna({'zona': _SIN_ZONA})
+
+    regionales = lineas.merge(zonas_regionales, on=['super_catalog_id', 'zona'], how='left', indicator=True)
+    afectada = lineas['super_catalog_id'].isin(productos_nacionales).to_numpy() | (
+        regionales['_merge'] == 'both').to_numpy()
+    return lineas.loc[afectada, columnas].drop_duplicates(ignore_index=True)
+
+
+def _en_pares(df, pares):
+    """Máscara de las filas de df cuyo (order_id, super_catalog_id) está en pares"""
+    if pares.empty or df.empty:
+        return np.zeros(len(df), dtype=bool)
+    claves = pd.MultiIndex.from_frame(pares[['order_id', 'super_catalog_id']].astype('int64'))
+    return pd.MultiIndex.from_arrays([df['order_id'].astype('int64'),
+                                      df['super_catalog_id'].astype('int64')]).isin(claves)
+
+
+def reporte_cambios_pos(kpis_anterior, kpis_actual, lineas):
+    """
+    Cambio del óptimo y del ahorro máximo de cada POS con líneas afectadas por el
+    catálogo, del mayor cambio absoluto al menor
+    """
+    if lineas.empty:
+        return pd.DataFrame(columns=COLUMNAS_REPORTE)
+
+    conteo = lineas.groupby('point_of_sale_id').size().rename('lineas_afectadas')
+    columnas = ['total_optimo', 'ahorro_maximo']
+    antes = kpis_anterior.set_index('point_of_sale_id')[columnas].reindex(conteo.index).fillna(0.0)
+    despues = kpis_actual.set_index('point_of_sale_id')[columnas].reindex(conteo.index).fillna(0.0)
+
+    reporte = pd.DataFrame({
+        'point_of_sale_id': conteo.index,
+        'lineas_afectadas': conteo.to_numpy(),
+        'total_optimo_anterior': antes['total_optimo'].to_numpy(),
+        'total_optimo': despues['total_optimo'].to_numpy(),
+        'ahorro_maximo_anterior': antes['ahorro_maximo'].to_numpy(),
+        'ahorro_maximo': despues['ahorro_maximo'].to_numpy(),
+    })
+    reporte['diferencia_ahorro'] = reporte['ahorro_maximo'] - reporte['ahorro_maximo_anterior']
+    orden = reporte['diferencia_ahorro'].abs().sort_values(ascending=False, kind='stable').index
+    return reporte.loc[orden, COLUMNAS_REPORTE].reset_index(drop=True)
+
+
+def leer_reporte_catalogo():
+    """
+    Reporte de POS afectados por la última actualización incremental del catálogo
+    (vacío si no hubo ninguna)
+    """
+    if not os.path.exists(RUTA_REPORTE_CATALOGO):
+        return pd.DataFrame(columns=COLUMNAS_REPORTE)
+    return pd.read_parquet(RUTA_REPORTE_CATALOGO)
+
+
+def _reemplazar_pos(anterior, nuevo, pos_afectados, claves):
+    """
+    Filas de anterior sin los POS afectados más las recalculadas, ordenadas por claves
+    """
+    conservadas = anterior[~anterior['point_of_sale_id'].isin(pos_afectados)]
+    partes = [df for df in (conservadas, nuevo) if not df.empty]
+    if not partes:
+        return anterior.iloc[:0]
+    return pd.concat(partes, ignore_index=True).sort_values(claves, kind='stable', ignore_index=True)
+
+
+def actualizar_incremental(indice_catalogo=None):
+    """
+    Frames del pipeline actualizados con las órdenes nuevas o modificadas y los
+    cambios del catálogo, en el orden de NOMBRES_FRAMES; None si no hay una
+    corrida anterior utilizable (otras entradas cambiaron o su caché ya no
+    existe) y hace falta procesar todo.
+    """
+    estado = leer_estado()
+    if estado is None:
+        return None
+    anteriores, meta = estado
+    if meta.get('huella_base') != huella_entradas_base():
+        return None
+
+    frames = cargar_frames(meta.get('huella_frames', ''), NOMBRES_FRAMES)
+    if frames is None:
+        return None
+    (pos_vendor_totals, _, pos_order_stats, df_min_purchase, df_vendor_dm,
+     pos_geo_zones, df_clasificado, df_vendors_pos, kpis_ahorro) = frames
+
+    with etapa('incremental.detectar_cambios') as m:
+        df_pedidos = leer_csv_tipado(ARCHIVO_PEDIDOS)
+        if 'geo_zone' in df_pedidos.columns:
+            df_pedidos = df_pedidos.drop(columns=['geo_zone'])
+        ordenes, pos_ordenes = ordenes_cambiadas(anteriores, huellas_ordenes(df_pedidos))
+
+        lineas = pd.DataFrame(columns=['order_id', 'super_catalog_id', 'point_of_sale_id'])
+        catalogo = None
+        if meta.get('huella_catalogo') != huella_catalogo():
+            if not os.path.exists(RUTA_SNAPSHOT_CATALOGO):
+                return None
+            catalogo = leer_csv_tipado(ARCHIVO_CATALOGO)
+            ofertas = ofertas_cambiadas(pd.read_parquet(RUTA_SNAPSHOT_CATALOGO), catalogo)
+            # Las órdenes nuevas o modificadas ya se reclasifican completas
+            lineas = lineas_afectadas(df_pedidos[~df_pedidos['order_id'].isin(ordenes)], pos_geo_zones, ofertas)
+            print(f"Catálogo: {len(ofertas):,} ofertas cambiadas, {len(lineas):,} líneas de pedido afectadas")
+        m.salida(len(ordenes) + len(lineas))
+
+    print(f"Ingesta incremental: {len(ordenes):,} órdenes nuevas o modificadas en {len(pos_ordenes):,} POS")
+    if not ordenes and lineas.empty:
+        if catalogo is not None:
+            _escribir_atomico(pd.DataFrame(columns=COLUMNAS_REPORTE), RUTA_REPORTE_CATALOGO)
+        return (pos_vendor_totals, df_pedidos, pos_order_stats, df_min_purchase, df_vendor_dm,
+                pos_geo_zones, df_clasificado, df_vendors_pos, kpis_ahorro)
+
+    if indice_catalogo is None:
+        indice_catalogo = IndiceCatalogo(catalogo if catalogo is not None else leer_csv_tipado(ARCHIVO_CATALOGO))
+
+    # Reclasificar las órdenes cambiadas completas y las líneas afectadas por el catálogo
+    a_recalcular = df_pedidos['order_id'].isin(ordenes).to_numpy() | _en_pares(df_pedidos, lineas)
+    condiciones = condiciones_compra(df_min_purchase)
+    clasificado_nuevo = clasificar_pedidos(df_pedidos[a_recalcular], pos_geo_zones, indice_catalogo,
+                                           df_vendors_pos, diagnostico=False, condiciones=condiciones)
+
+    with etapa('incremental.combinar', clasificado_nuevo) as m:
+        if not df_clasificado.empty:
+            reemplazadas = df_clasificado['order_id'].isin(ordenes).to_numpy() | _en_pares(df_clasificado, lineas)
+            df_clasificado = df_clasificado[~reemplazadas]
+        df_clasificado = concatenar_bloques([df_clasificado, clasificado_nuevo])
+        # La canasta de cada vendor abarca toda la orden: recalcular el costo puesto
+        # de las órdenes que solo tuvieron algunas líneas reclasificadas
+        if not lineas.empty and not df_clasificado.empty:
+            parciales = df_clasificado['order_id'].isin(lineas['order_id']).to_numpy()
+            costo_puesto = agregar_costo_puesto(df_clasificado[parciales], condiciones)
+            for col in COLUMNAS_COSTO_PUESTO:
+                if col in costo_puesto.columns:
+                    df_clasificado.loc[parciales, col] = costo_puesto[col].to_numpy()
+        if not df_clasificado.empty:
+            df_clasificado = df_clasificado.sort_values('point_of_sale_id', kind='stable', ignore_index=True)
+        m.salida(df_clasificado)
+
+    # Agregados: los de compras solo dependen de los pedidos; los KPIs de ahorro
+    # también de las ofertas
+    with etapa('incremental.agregados_pos'):
+        pedidos_afectados = df_pedidos[df_pedidos['point_of_sale_id'].isin(pos_ordenes)]
+        order_stats_pos, vendor_totals_pos = estadisticas_pedidos(pedidos_afectados)
+        pos_order_stats = _reemplazar_pos(pos_order_stats, order_stats_pos, pos_ordenes, ['point_of_sale_id'])
+        pos_vendor_totals = _reemplazar_pos(pos_vendor_totals, vendor_totals_pos, pos_ordenes,
+                                            ['point_of_sale_id', 'vendor_id'])
+
+        pos_kpis = pos_ordenes | set(lineas['point_of_sale_id'].astype('int64').tolist())
+        clasificado_afectado = df_clasificado[df_clasificado['point_of_sale_id'].isin(pos_kpis)]
+        kpis_anterior = kpis_ahorro
+        kpis_ahorro = _reemplazar_pos(kpis_ahorro, kpis_ahorro_por_pos(clasificado_afectado), pos_kpis,
+                                      ['point_of_sale_id'])
+
+    if catalogo is not None:
+        reporte = reporte_cambios_pos(kpis_anterior, kpis_ahorro, lineas)
+        _escribir_atomico(reporte, RUTA_REPORTE_CATALOGO)
+        if not reporte.empty:
+            print("POS con más cambio de ahorro por el catálogo:\n" + reporte.head(10).to_string(index=False))
+
+    return (pos_vendor_totals, df_pedidos, pos_order_stats, df_min_purchase, df_vendor_dm,
+            pos_geo_zones, df_clasificado, df_vendors_pos, kpis_ahorro)
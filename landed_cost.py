@@ -0,0 +1,103 @@
+"""
+Costo puesto de cada oferta a partir de minimum_purchase.csv: condiciones de
+compra mínima y envío del vendor en la zona del POS (con la fila nacional del
+vendor como respaldo), canasta de la orden con ese vendor, envío prorrateado y
+marca de las ofertas cuya canasta no alcanza el mínimo de compra
+"""
+import numpy as np
+import pandas as pd
+
+from catalog_index import ZONA_NACIONAL
+
+COLUMNAS_CONDICIONES = ['vendor_id', 'zona', 'min_purchase', 'shipping_cost', 'min_free_delivery']
+TERMINOS = ['min_purchase', 'shipping_cost', 'min_free_delivery']
+COLUMNAS_COSTO_PUESTO = ['canasta_vendor', 'envio_asignado', 'costo_puesto', 'alcanza_minimo']
+
+
+def condiciones_compra(df_min_purchase):
+    """
+    Condiciones vigentes por (vendor_id, zona): sin las filas borradas y, si un
+    par se repite, la última actualización
+    """
+    if df_min_purchase.empty or any(col not in df_min_purchase.columns for col in ['vendor_id', 'name'] + TERMINOS):
+        return pd.DataFrame(columns=COLUMNAS_CONDICIONES)
+
+    condiciones = df_min_purchase
+    if 'deleted_at' in condiciones.columns:
+        condiciones = condiciones[condiciones['deleted_at'].isna()]
+    if 'updated_at' in condiciones.columns:
+        condiciones = condiciones.sort_values('updated_at', kind='stable')
+
+    condiciones = pd.DataFrame({
+        'vendor_id': pd.to_numeric(condiciones['vendor_id'], errors='coerce'),
+        'zona': condiciones['name'].astype(object),
+        **{col: pd.to_numeric(condiciones[col], errors='coerce').fillna(0.0).astype(float) for col in TERMINOS},
+    })
+    return (condiciones.dropna(subset=['vendor_id', 'zona'])
+            .drop_duplicates(['vendor_id', 'zona'], keep='last')
+            .reset_index(drop=True))
+
+
+def terminos_vendor(vendors, zonas, condiciones):
+    """
+    min_purchase, shipping_cost y min_free_delivery de cada par (vendor, zona),
+    con la fila nacional del vendor si no tiene una para la zona y 0 si no tiene
+    ninguna. Devuelve un DataFrame alineado con las entradas.
+    """
+    consulta = pd.DataFrame({
+        'vendor_id': pd.to_numeric(pd.Series(np.asarray(vendors)), errors='coerce').to_numpy(dtype=float),
+        'zona': pd.Series(zonas, dtype=object).to_numpy(),
+    })
+    condiciones = condiciones.assign(vendor_id=condiciones['vendor_id'].astype(float))
+
+    resultado = consulta.merge(condiciones, on=['vendor_id', 'zona'], how='left')
+    nacional = condiciones.loc[condiciones['zona'] == ZONA_NACIONAL, ['vendor_id'] + TERMINOS]
+    respaldo = consulta[['vendor_id']].merge(nacional, on='vendor_id', how='left')
+
+    sin_zona = resultado['min_purchase'].isna().to_numpy()
+    resultado.loc[sin_zona, TERMINOS] = respaldo.loc[sin_zona, TERMINOS].to_numpy()
+    return resultado[TERMINOS].fillna(0.0).astype(float)
+
+
+def canasta_por_vendor(df, vendor_col, claves_orden=('point_of_sale_id', 'order_id')):
+    """
+    Valor de la canasta de cada orden si se compraran a cada vendor todos los
+    productos que ofrece en ella (su oferta más barata por producto), difundido a
+    cada fila
+    """
+    claves = list(claves_orden) + [vendor_col]
+    mejor_por_producto = (df.groupby(claves + ['super_catalog_id'], sort=False, observed=True)
+                          ['precio_total_vendedor'].min())
+    canasta = mejor_por_producto.groupby(level=claves, sort=False).sum()
+    return canasta.reindex(pd.MultiIndex.from_frame(df[claves])).to_numpy(dtype=float)
+
+
+def agregar_costo_puesto(df, condiciones, vendor_col=None, columna_zona='geo_zone'):
+    """
+    Agrega canasta_vendor, envio_asignado (el shipping_cost del vendor, si su
+    canasta queda bajo min_free_delivery, prorrateado según el peso de la oferta
+    en la canasta y sin superar el costo completo), costo_puesto (precio_total_vendedor más el envío) y
+    alcanza_minimo (la canasta llega a min_purchase)
+    """
+    from scoring_engine import columna_vendor
+
+    vendor_col = vendor_col or columna_vendor(df)
+    columnas = ['point_of_sale_id', 'order_id', 'super_catalog_id', 'precio_total_vendedor', columna_zona]
+    if df.empty or vendor_col is None or any(col not in df.columns for col in columnas):
+        return df
+
+    terminos = terminos_vendor(df[vendor_col].to_numpy(), df[columna_zona].astype(object).to_numpy(), condiciones)
+    canasta = canasta_por_vendor(df, vendor_col)
+    precio_total = df['precio_total_vendedor'].to_numpy(dtype=float)
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        paga_envio = (canasta < terminos['min_free_delivery'].to_numpy()) & (canasta > 0)
+        peso = np.minimum(precio_total / canasta, 1.0)
+        envio = np.where(paga_envio, terminos['shipping_cost'].to_numpy() * peso, 0.0)
+
+    result_df = df.copy()
+    result_df['canasta_vendor'] = canasta
+    result_df['envio_asignado'] = envio
+    result_df['costo_puesto'] = precio_total + envio
+    result_df['alcanza_minimo'] = canasta >= terminos['min_purchase'].to_numpy()
+    return result_df
@@ -0,0 +1,447 @@
+"""
+Etapas del pipeline de pedidos: zonas de los POS, cruce con el catálogo,
+clasificación y agregados por POS, sobre el archivo completo o por bloques
+"""
+import os
+import traceback
+
+import pandas as pd
+
+from catalog_index import IndiceCatalogo
+from disk_cache import cargar_frames, guardar_frames, huella_entradas
+from geo_zones import zonas_pos
+from landed_cost import agregar_costo_puesto, condiciones_compra
+from profiling import etapa
+from schemas import ESQUEMAS, aplicar_esquema, leer_csv_tipado, reporte_memoria
+from scoring_engine import (
+    adjuntar_status_relacion,
+    agregar_clasificacion,
+    combinar_kpis_parciales,
+    diagnostico_join_relaciones,
+    finalizar_kpis,
+    kpis_ahorro_por_pos,
+    kpis_parciales,
+)
+
+ARCHIVO_PEDIDOS = 'orders_delivered_pos_vendor_geozone.csv'
+ARCHIVO_CATALOGO = 'vendors_catalog.csv'
+TAMANO_BLOQUE_PEDIDOS = 200_000
+
+# Archivos de entrada del pipeline y versión de su lógica; subir PIPELINE_VERSION
+# cuando cambie la forma de procesar los datos invalida la caché en disco
+PIPELINE_VERSION = 4
+ARCHIVOS_ENTRADA = [
+    'pos_address.csv', ARCHIVO_PEDIDOS, ARCHIVO_CATALOGO,
+    'vendor_pos_relations.csv', 'vendors_dm.csv', 'minimum_purchase.csv'
+]
+NOMBRES_FRAMES = [
+    'pos_vendor_totals', 'df_pedidos', 'pos_order_stats', 'df_min_purchase',
+    'df_vendor_dm', 'pos_geo_zones', 'df_clasificado', 'df_vendors_pos', 'kpis_ahorro'
+]
+
+# Tamaño de bloque para leer los pedidos en modo streaming (0 = archivo completo)
+BLOQUE_PEDIDOS = int(os.environ.get('SCORING_BLOQUE_PEDIDOS', '0'))
+
+# Motor del cruce con el catálogo: 'pandas' en memoria o 'sqlite' sobre una base local
+BACKENDS = ['pandas', 'sqlite']
+BACKEND = os.environ.get('SCORING_BACKEND', 'pandas')
+
+# Actualización incremental: si solo cambiaron los pedidos o el catálogo, procesar
+# únicamente las órdenes y líneas afectadas (modo pandas sobre el archivo completo)
+INCREMENTAL = os.environ.get('SCORING_INCREMENTAL') == '1'
+
+COLUMNAS_ORDER_STATS = ['point_of_sale_id', 'promedio_por_orden', 'numero_ordenes']
+COLUMNAS_VENDOR_TOTALS = ['point_of_sale_id', 'vendor_id', 'total_compra']
+
+
+def clasificar_pedidos(df_pedidos, pos_geo_zones, indice_catalogo, df_vendors_pos, diagnostico=True,
+                       condiciones=None):
+    """
+    Cruza los pedidos con las ofertas del catálogo de su zona (y las nacionales),
+    adjunta el status de la relación vendor-POS y clasifica cada oferta. Con las
+    condiciones de compra (condiciones_compra) agrega además el costo puesto.
+    Devuelve un DataFrame vacío si faltan columnas para el precio mínimo.
+    """
+    # Unir pedidos con zonas geográficas
+    with etapa('pipeline.zonas_pedidos', df_pedidos) as m:
+        df_pedidos_zonas = pd.merge(df_pedidos, pos_geo_zones, on='point_of_sale_id', how='left')
+        df_pedidos_zonas = m.salida(df_pedidos_zonas[df_pedidos_zonas['unidades_pedidas'] > 0])
+
+    # Ofertas nacionales y regionales de cada línea, con el precio ya calculado en el índice
+    with etapa('pipeline.ofertas_catalogo', df_pedidos_zonas) as m:
+        df_pedidos_proveedores = m.salida(indice_catalogo.ofertas_para(df_pedidos_zonas))
+
+    # Calcular precio_total_vendedor
+    if 'precio_vendedor' in df_pedidos_proveedores.columns and 'unidades_pedidas' in df_pedidos_proveedores.columns:
+        df_pedidos_proveedores['precio_total_vendedor'] = (
+            df_pedidos_proveedores['unidades_pedidas'].astype(float) *
+            df_pedidos_proveedores['precio_vendedor'].astype(float)
+        )
+
+    # Status de la relación vendor-POS: lookup por (point_of_sale_id, vendor del catálogo)
+    # Si el archivo de pedidos trae vendor_id, el vendor del catálogo queda como vendor_id_y
+    vendor_catalogo_col = 'vendor_id_y' if 'vendor_id_y' in df_pedidos_proveedores.columns else 'vendor_id'
+    if vendor_catalogo_col in df_pedidos_proveedores.columns and 'point_of_sale_id' in df_pedidos_proveedores.columns:
+        if vendor_catalogo_col == 'vendor_id':
+            # Renombrar la columna vendor_id original para evitar conflictos
+            df_pedidos_proveedores = df_pedidos_proveedores.rename(columns={'vendor_id': 'drug_manufacturer_id'})
+            vendor_catalogo_col = 'drug_manufacturer_id'
+
+        df_sin_status = df_pedidos_proveedores
+        with etapa('pipeline.join_status', df_sin_status) as m:
+            df_pedidos_proveedores = m.salida(
+                adjuntar_status_relacion(df_pedidos_proveedores, df_vendors_pos, vendor_catalogo_col))
+
+        if diagnostico:
+            resumen = diagnostico_join_relaciones(df_sin_status, df_pedidos_proveedores, df_vendors_pos)
+            print(
+                f"Join vendor_pos_relations: {resumen['filas_antes']:,} -> {resumen['filas_despues']:,} filas, "
+                f"{resumen['memoria_antes_mb']:.1f} -> {resumen['memoria_despues_mb']:.1f} MB "
+                f"(join solo por POS: {resumen['filas_join_solo_pos']:,} filas, "
+                f"~{resumen['memoria_join_solo_pos_mb']:.1f} MB)"
+            )
+
+    # Calcular precios mínimos locales
+    cols_needed = ['point_of_sale_id', 'super_catalog_id', 'precio_minimo', 'order_id']
+    if not all(col in df_pedidos_proveedores.columns for col in cols_needed):
+        return pd.DataFrame()
+
+    with etapa('pipeline.precios_minimos', df_pedidos_proveedores) as m:
+        min_prices = (df_pedidos_proveedores
+                      .groupby(['point_of_sale_id', 'order_id', 'super_catalog_id'])['precio_minimo']
+                      .min()
+                      .reset_index())
+        min_prices.columns = ['point_of_sale_id', 'order_id', 'super_catalog_id', 'precio_minimo_orders']
+
+        df_con_precios_minimos_local = m.salida(pd.merge(
+            df_pedidos_proveedores, min_prices,
+            on=['point_of_sale_id', 'super_catalog_id', 'order_id'], how='left'
+        ))
+
+    with etapa('pipeline.clasificacion', df_con_precios_minimos_local) as m:
+        df_clasificado = m.salida(agregar_clasificacion(df_con_precios_minimos_local))
+
+    # Compra mínima y envío del vendor según la canasta de cada orden
+    if condiciones is not None:
+        with etapa('pipeline.costo_puesto', df_clasificado) as m:
+            df_clasificado = m.salida(agregar_costo_puesto(df_clasificado, condiciones))
+    return df_clasificado
+
+
+def _con_total_compra(df_pedidos):
+    if ('total_compra' not in df_pedidos.columns and 'unidades_pedidas' in df_pedidos.columns
+            and 'precio_minimo' in df_pedidos.columns):
+        df_pedidos = df_pedidos.assign(total_compra=df_pedidos['unidades_pedidas'] * df_pedidos['precio_minimo'])
+    return df_pedidos
+
+
+def estadisticas_parciales(df_pedidos):
+    """
+    Sumas parciales por POS de un bloque de pedidos: total y número de órdenes,
+    y total por (POS, vendor). Ambas son aditivas entre bloques.
+    """
+    df_orders = _con_total_compra(df_pedidos)
+    columnas = set(df_orders.columns)
+
+    ordenes = pd.DataFrame(columns=['point_of_sale_id', 'suma_ordenes', 'numero_ordenes'])
+    if {'point_of_sale_id', 'order_id', 'total_compra'} <= columnas:
+        order_totals = df_orders.groupby(['point_of_sale_id', 'order_id'])['total_compra'].sum()
+        ordenes = (order_totals.groupby(level='point_of_sale_id')
+                   .agg(suma_ordenes='sum', numero_ordenes='count')
+                   .reset_index())
+
+    vendor_totals = pd.DataFrame(columns=COLUMNAS_VENDOR_TOTALS)
+    if {'point_of_sale_id', 'vendor_id', 'total_compra'} <= columnas:
+        vendor_totals = df_orders.groupby(['point_of_sale_id', 'vendor_id'])['total_compra'].sum().reset_index()
+
+    return ordenes, vendor_totals
+
+
+def _combinar_sumas(a, b, claves):
+    if a is None:
+        return b
+    return pd.concat([a, b], ignore_index=True).groupby(claves, as_index=False).sum()
+
+
+def finalizar_estadisticas(ordenes, vendor_totals):
+    """
+    pos_order_stats y pos_vendor_totals a partir de las sumas parciales combinadas
+    """
+    if ordenes is None or ordenes.empty:
+        pos_order_stats = pd.DataFrame(columns=COLUMNAS_ORDER_STATS)
+    else:
+        pos_order_stats = pd.DataFrame({
+            'point_of_sale_id': ordenes['point_of_sale_id'],
+            'promedio_por_orden': ordenes['suma_ordenes'] / ordenes['numero_ordenes'],
+            'numero_ordenes': ordenes['numero_ordenes'].astype('int64'),
+        })
+
+    if vendor_totals is None:
+        vendor_totals = pd.DataFrame(columns=COLUMNAS_VENDOR_TOTALS)
+
+    return pos_order_stats, vendor_totals
+
+
+def estadisticas_pedidos(df_pedidos):
+    """
+    Promedio y número de órdenes por POS, y total comprado por (POS, vendor)
+    """
+    return finalizar_estadisticas(*estadisticas_parciales(df_pedidos))
+
+
+def leer_pedidos_por_bloques(ruta=ARCHIVO_PEDIDOS, tamano_bloque=TAMANO_BLOQUE_PEDIDOS):
+    """
+    Lee el archivo de pedidos por bloques tipados sin cortar ninguna orden: las filas
+    de la última order_id de cada bloque pasan al siguiente. Supone, como en la
+    exportación, que las líneas de una misma orden son contiguas.
+    """
+    esquema = ESQUEMAS.get(ARCHIVO_PEDIDOS, {})
+    dtype_lectura = {col: dtype for col, dtype in esquema.items() if not dtype.startswith('int')}
+
+    pendiente = None
+    for bloque in pd.read_csv(ruta, dtype=dtype_lectura, chunksize=tamano_bloque):
+        if pendiente is not None:
+            bloque = pd.concat([pendiente, bloque], ignore_index=True)
+
+        ordenes = bloque['order_id'].to_numpy()
+        otras = (ordenes != ordenes[-1]).nonzero()[0]
+        if len(otras) == 0:
+            # Todo el bloque es una sola orden: seguir acumulando
+            pendiente = bloque
+            continue
+
+        corte = otras[-1] + 1
+        pendiente = bloque.iloc[corte:]
+        yield aplicar_esquema(bloque.iloc[:corte].copy(), esquema)
+
+    if pendiente is not None and not pendiente.empty:
+        yield aplicar_esquema(pendiente.copy(), esquema)
+
+
+def concatenar_bloques(bloques):
+    """
+    Concatena bloques clasificados conservando como categóricas las columnas que
+    lo eran en los bloques (concat las vuelve object si las categorías difieren)
+    """
+    bloques = [b for b in bloques if not b.empty]
+    if not bloques:
+        return pd.DataFrame()
+
+    categoricas = {col for b in bloques for col in b.columns if isinstance(b[col].dtype, pd.CategoricalDtype)}
+    df = pd.concat(bloques, ignore_index=True)
+    for col in categoricas:
+        if not isinstance(df[col].dtype, pd.CategoricalDtype):
+            df[col] = df[col].astype('category')
+    return df
+
+
+def procesar_pedidos_por_bloques(pos_geo_zones, indice_catalogo, df_vendors_pos,
+                                 ruta=ARCHIVO_PEDIDOS, tamano_bloque=TAMANO_BLOQUE_PEDIDOS,
+                                 conservar_clasificado=True, condiciones=None):
+    """
+    Modo streaming del pipeline: cada bloque de pedidos se cruza con el catálogo,
+    se clasifica y se reduce a agregados por POS, así el pico de memoria de los
+    merges depende del tamaño de bloque y no del largo del historial.
+
+    Devuelve un dict con pos_order_stats, pos_vendor_totals, kpis_ahorro, paises
+    (point_of_sale_id, country) y df_clasificado (vacío si conservar_clasificado=False).
+    """
+    ordenes = vendor_totals = kpis = paises = None
+    clasificados = []
+    filas = 0
+
+    for df_pedidos in leer_pedidos_por_bloques(ruta, tamano_bloque):
+        filas += len(df_pedidos)
+        with etapa('pipeline.estadisticas_pedidos', df_pedidos):
+            ordenes_bloque, vendor_totals_bloque = estadisticas_parciales(df_pedidos)
+            ordenes = _combinar_sumas(ordenes, ordenes_bloque, 'point_of_sale_id')
+            vendor_totals = _combinar_sumas(vendor_totals, vendor_totals_bloque, ['point_of_sale_id', 'vendor_id'])
+
+        if 'country' in df_pedidos.columns:
+            paises_bloque = df_pedidos[['point_of_sale_id', 'country']].drop_duplicates('point_of_sale_id')
+            paises = paises_bloque if paises is None else (
+                pd.concat([paises, paises_bloque], ignore_index=True).drop_duplicates('point_of_sale_id'))
+
+        if 'geo_zone' in df_pedidos.columns:
+            df_pedidos = df_pedidos.drop(columns=['geo_zone'])
+
+        df_clasificado = clasificar_pedidos(df_pedidos, pos_geo_zones, indice_catalogo, df_vendors_pos,
+                                            diagnostico=False, condiciones=condiciones)
+        with etapa('pipeline.kpis_ahorro', df_clasificado):
+            kpis = combinar_kpis_parciales(kpis, kpis_parciales(df_clasificado))
+        if conservar_clasificado:
+            clasificados.append(df_clasificado)
+
+    pos_order_stats, pos_vendor_totals = finalizar_estadisticas(ordenes, vendor_totals)
+    df_clasificado = concatenar_bloques(clasificados)
+    if not df_clasificado.empty:
+        df_clasificado = df_clasificado.sort_values('point_of_sale_id', kind='stable', ignore_index=True)
+
+    print(f"Pedidos procesados por bloques de {tamano_bloque:,}: {filas:,} filas")
+
+    return {
+        'pos_order_stats': pos_order_stats,
+        'pos_vendor_totals': pos_vendor_totals,
+        'kpis_ahorro': finalizar_kpis(kpis),
+        'paises': paises if paises is not None else pd.DataFrame(columns=['point_of_sale_id', 'country']),
+        'df_clasificado': df_clasificado,
+    }
+
+
+def huella_pipeline():
+    """
+    Huella de los CSV de entrada y de la versión del pipeline
+    """
+    version = f"{PIPELINE_VERSION}-bloque{BLOQUE_PEDIDOS}"
+    if BACKEND == 'sqlite':
+        version += '-sqlite'
+    return huella_entradas(ARCHIVOS_ENTRADA, version)
+
+
+def huella_catalogo():
+    """
+    Huella del catálogo de vendors (y de la versión del pipeline)
+    """
+    return huella_entradas([ARCHIVO_CATALOGO], PIPELINE_VERSION)
+
+
+def cargar_indice_catalogo():
+    """
+    Índice de precios construido desde el catálogo de vendors
+    """
+    return IndiceCatalogo(leer_csv_tipado(ARCHIVO_CATALOGO))
+
+
+def cargar_vendors_dm():
+    """
+    Carga y procesa el archivo vendors_dm.csv
+    """
+    try:
+        df_vendor_dm = pd.read_csv('vendors_dm.csv', nrows=0)
+        renombrar = None
+        if 'client_id' in df_vendor_dm.columns and 'vendor_id' not in df_vendor_dm.columns:
+            renombrar = {'client_id': 'vendor_id'}
+        return leer_csv_tipado('vendors_dm.csv', renombrar=renombrar)
+    except Exception as e:
+        print(f"Error al procesar vendors_dm.csv: {e}")
+        return pd.DataFrame(columns=['vendor_id', 'name', 'drug_manufacturer_id'])
+
+
+def leer_archivos_basicos():
+    """
+    Direcciones de los POS, relaciones vendor-POS, vendors_dm y compras mínimas
+    """
+    with etapa('pipeline.leer_csv') as m:
+        df_pos_address = leer_csv_tipado('pos_address.csv')
+        df_vendors_pos = leer_csv_tipado('vendor_pos_relations.csv')
+        #df_products = pd.read_csv('top_5_productos_geozona.csv')
+        df_vendor_dm = cargar_vendors_dm()
+
+        try:
+            df_min_purchase = leer_csv_tipado('minimum_purchase.csv')
+        except FileNotFoundError:
+            df_min_purchase = pd.DataFrame(columns=['vendor_id', 'name', 'min_purchase'])
+        m.salida(len(df_pos_address) + len(df_vendors_pos) + len(df_vendor_dm) + len(df_min_purchase))
+
+    return df_pos_address, df_vendors_pos, df_vendor_dm, df_min_purchase
+
+
+def procesar_datos(indice_catalogo=None):
+    """
+    Ejecuta el pipeline completo sobre los CSV y devuelve los frames en el orden
+    de NOMBRES_FRAMES (todos vacíos si algo falla)
+    """
+    if BACKEND == 'sqlite':
+        from sql_backend import procesar_datos_sql
+        return procesar_datos_sql()
+
+    try:
+        # Cargar archivos básicos
+        df_pos_address, df_vendors_pos, df_vendor_dm, df_min_purchase = leer_archivos_basicos()
+
+        # Zonas de los POS e índice de precios del catálogo
+        with etapa('pipeline.zonas_pos', df_pos_address) as m:
+            pos_geo_zones = m.salida(zonas_pos(df_pos_address))
+        condiciones = condiciones_compra(df_min_purchase)
+        if indice_catalogo is None:
+            with etapa('pipeline.indice_catalogo') as m:
+                indice_catalogo = cargar_indice_catalogo()
+                m.salida(len(indice_catalogo))
+
+        if BLOQUE_PEDIDOS > 0:
+            # Modo streaming: de los pedidos crudos solo se conserva el país de cada POS
+            resultado = procesar_pedidos_por_bloques(
+                pos_geo_zones, indice_catalogo, df_vendors_pos,
+                ruta=ARCHIVO_PEDIDOS, tamano_bloque=BLOQUE_PEDIDOS, condiciones=condiciones
+            )
+            df_pedidos = resultado['paises']
+            pos_order_stats = resultado['pos_order_stats']
+            pos_vendor_totals = resultado['pos_vendor_totals']
+            df_clasificado = resultado['df_clasificado']
+            kpis_ahorro = resultado['kpis_ahorro']
+        else:
+            with etapa('pipeline.leer_pedidos') as m:
+                df_pedidos = m.salida(leer_csv_tipado(ARCHIVO_PEDIDOS))
+
+            # Limpiar columnas duplicadas
+            if 'geo_zone' in df_pedidos.columns:
+                df_pedidos = df_pedidos.drop(columns=['geo_zone'])
+
+            # Clasificar productos y ordenar por POS para el índice de particiones
+            df_clasificado = clasificar_pedidos(
+                df_pedidos, pos_geo_zones, indice_catalogo, df_vendors_pos, condiciones=condiciones
+            )
+            if not df_clasificado.empty:
+                with etapa('pipeline.ordenar_por_pos', df_clasificado):
+                    df_clasificado = df_clasificado.sort_values('point_of_sale_id', kind='stable', ignore_index=True)
+
+            with etapa('pipeline.estadisticas_pedidos', df_pedidos):
+                pos_order_stats, pos_vendor_totals = estadisticas_pedidos(df_pedidos)
+            with etapa('pipeline.kpis_ahorro', df_clasificado) as m:
+                kpis_ahorro = m.salida(kpis_ahorro_por_pos(df_clasificado))
+
+        frames = (pos_vendor_totals, df_pedidos, pos_order_stats, df_min_purchase, df_vendor_dm,
+                  pos_geo_zones, df_clasificado, df_vendors_pos, kpis_ahorro)
+        print("Memoria por frame:\n" + reporte_memoria(dict(zip(NOMBRES_FRAMES, frames))).to_string(index=False))
+
+        return frames
+
+    except Exception:
+        print("Error en process_data:", traceback.format_exc())
+        return tuple(pd.DataFrame() for _ in NOMBRES_FRAMES)
+
+
+def cargar_datos(huella=None, indice_catalogo=None):
+    """
+    Frames procesados, leídos de la caché en disco si la huella de las entradas no
+    cambió; si no, ejecuta el pipeline y guarda el resultado
+    """
+    huella = huella or huella_pipeline()
+
+    with etapa('pipeline.leer_cache_disco') as m:
+        frames = cargar_frames(huella, NOMBRES_FRAMES)
+        if frames is not None and BACKEND == 'sqlite':
+            # Con el backend sqlite las ofertas clasificadas viven en la base, no en los frames
+            from sql_backend import base_vigente
+            frames = frames if base_vigente(huella) else None
+        if frames is not None:
+            m.salida(len(frames[NOMBRES_FRAMES.index('df_clasificado')]))
+    if frames is not None:
+        return frames
+
+    incremental = INCREMENTAL and BACKEND == 'pandas' and BLOQUE_PEDIDOS == 0
+    frames = None
+    if incremental:
+        from incremental import actualizar_incremental
+        frames = actualizar_incremental(indice_catalogo)
+    if frames is None:
+        frames = procesar_datos(indice_catalogo)
+
+    # No guardar el resultado vacío de un error
+    if not all(df.empty for df in frames):
+        with etapa('pipeline.guardar_cache_disco'):
+            guardado = guardar_frames(huella, NOMBRES_FRAMES, frames)
+        if incremental and guardado:
+            from incremental import guardar_estado
+            guardar_estado(huella, frames[NOMBRES_FRAMES.index('df_pedidos')])
+    return frames
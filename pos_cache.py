@@ -0,0 +1,150 @@
+"""
+Caché en memoria de resultados por POS, compartida entre hilos y sesiones
+"""
+import sys
+import threading
+import time
+from collections import OrderedDict
+
+import pandas as pd
+
+MAX_ENTRADAS_DEFECTO = 3000
+MAX_MB_DEFECTO = 512
+TTL_DEFECTO = 3600
+
+
+def tamano_bytes(valor):
+    """
+    Tamaño aproximado en memoria de un resultado: DataFrames y Series con
+    memory_usage(deep=True), dicts, listas y tuplas recorriendo sus elementos
+    """
+    if isinstance(valor, pd.DataFrame):
+        return int(valor.memory_usage(index=True, deep=True).sum())
+    if isinstance(valor, pd.Series):
+        return int(valor.memory_usage(index=True, deep=True))
+    if isinstance(valor, dict):
+        return sys.getsizeof(valor) + sum(tamano_bytes(k) + tamano_bytes(v) for k, v in valor.items())
+    if isinstance(valor, (list, tuple)):
+        return sys.getsizeof(valor) + sum(tamano_bytes(v) for v in valor)
+    return sys.getsizeof(valor)
+
+
+class CachePOS:
+    """
+    Caché acotada de resultados por clave (por ejemplo (pos, consulta)) con
+    límite de entradas y de bytes (se descarta la usada hace más tiempo), TTL
+    desde que se guardó cada entrada y contadores de aciertos y fallos.
+    max_bytes o ttl en None desactivan ese límite. Los valores se comparten,
+    así que quien los lee no debe modificarlos.
+    """
+
+    def __init__(self, max_entradas=MAX_ENTRADAS_DEFECTO, max_bytes=MAX_MB_DEFECTO * 1024 ** 2, ttl=TTL_DEFECTO,
+                 reloj=time.monotonic):
+        self.max_entradas = max_entradas
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._reloj = reloj
+        # clave -> (valor, bytes, guardado en)
+        self._datos = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.aciertos = self.fallos = self.expirados = self.desalojos = 0
+
+    def __len__(self):
+        with self._lock:
+            return len(self._datos)
+
+    def __contains__(self, clave):
+        with self._lock:
+            entrada = self._datos.get(clave)
+            return entrada is not None and not self._vencida(entrada)
+
+    @property
+    def bytes(self):
+        return self._bytes
+
+    @property
+    def llena(self):
+        """Si guardar otra entrada desalojaría alguna (aproximado para los bytes)"""
+        with self._lock:
+            return (len(self._datos) >= self.max_entradas
+                    or (self.max_bytes is not None and self._bytes >= 0.9 * self.max_bytes))
+
+    def _vencida(self, entrada):
+        return self.ttl is not None and self._reloj() - entrada[2] > self.ttl
+
+    def _quitar(self, clave):
+        _, tamano, _ = self._datos.pop(clave)
+        self._bytes -= tamano
+
+    def obtener(self, clave, defecto=None):
+        with self._lock:
+            entrada = self._datos.get(clave)
+            if entrada is not None and self._vencida(entrada):
+                self._quitar(clave)
+                self.expirados += 1
+                entrada = None
+            if entrada is None:
+                self.fallos += 1
+                return defecto
+            self.aciertos += 1
+            self._datos.move_to_end(clave)
+            return entrada[0]
+
+    def guardar(self, clave, valor):
+        tamano = tamano_bytes(valor)
+        with self._lock:
+            if clave in self._datos:
+                self._quitar(clave)
+            if self.max_bytes is not None and tamano > self.max_bytes:
+                # No entra ni vaciando la caché
+                return
+            self._datos[clave] = (valor, tamano, self._reloj())
+            self._bytes += tamano
+            while (len(self._datos) > self.max_entradas
+                   or (self.max_bytes is not None and self._bytes > self.max_bytes)):
+                self._quitar(next(iter(self._datos)))
+                self.desalojos += 1
+
+    def obtener_o_calcular(self, clave, calcular):
+        """
+        Valor guardado para clave o, si no está, calcular() guardado. El cálculo
+        corre fuera del lock: dos hilos pueden calcular la misma clave a la vez.
+        """
+        faltante = object()
+        valor = self.obtener(clave, faltante)
+        if valor is faltante:
+            valor = calcular()
+            self.guardar(clave, valor)
+        return valor
+
+    def purgar_vencidas(self):
+        """Quita las entradas con el TTL vencido y devuelve cuántas quitó"""
+        with self._lock:
+            vencidas = [clave for clave, entrada in self._datos.items() if self._vencida(entrada)]
+            for clave in vencidas:
+                self._quitar(clave)
+            self.expirados += len(vencidas)
+            return len(vencidas)
+
+    def estadisticas(self):
+        """Entradas, bytes, límites y contadores (la tasa de aciertos es NaN sin consultas)"""
+        with self._lock:
+            consultas = self.aciertos + self.fallos
+            return {
+                'entradas': len(self._datos),
+                'max_entradas': self.max_entradas,
+                'mb': self._bytes / 1024 ** 2,
+                'max_mb': self.max_bytes / 1024 ** 2 if self.max_bytes is not None else None,
+                'ttl_segundos': self.ttl,
+                'aciertos': self.aciertos,
+                'fallos': self.fallos,
+                'tasa_aciertos': self.aciertos / consultas if consultas else float('nan'),
+                'expirados': self.expirados,
+                'desalojos': self.desalojos,
+            }
+
+    def limpiar(self):
+        with self._lock:
+            self._datos.clear()
+            self._bytes = 0
@@ -0,0 +1,157 @@
+"""
+Instrumentación por etapas: tiempo, filas de entrada/salida y variación de
+memoria del proceso, acumuladas en un perfil y emitidas como logs JSON
+"""
+import contextvars
+import json
+import logging
+import os
+import time
+from contextlib import contextmanager
+
+import pandas as pd
+
+logger = logging.getLogger('scoring.perfil')
+logger.addHandler(logging.NullHandler())
+
+_perfil_activo = contextvars.ContextVar('perfil_activo', default=None)
+
+COLUMNAS_PERFIL = ['etapa', 'segundos', 'filas_entrada', 'filas_salida', 'memoria_inicio_mb',
+                   'memoria_delta_mb', 'inicio']
+
+
+def memoria_proceso_mb():
+    """
+    Memoria residente del proceso en MB (psutil si está instalado, si no
+    /proc/self/statm; NaN si ninguno está disponible)
+    """
+    try:
+        import psutil
+        return psutil.Process().memory_info().rss / 1024 ** 2
+    except ImportError:
+        pass
+    try:
+        with open('/proc/self/statm') as f:
+            paginas = int(f.read().split()[1])
+        return paginas * os.sysconf('SC_PAGE_SIZE') / 1024 ** 2
+    except (OSError, ValueError, IndexError):
+        return float('nan')
+
+
+def _filas(valor):
+    if valor is None:
+        return None
+    if isinstance(valor, int):
+        return valor
+    return len(valor)
+
+
+class Medicion:
+    """
+    Medición de una etapa en curso; salida() registra las filas producidas
+    """
+
+    def __init__(self, nombre, filas_entrada=None):
+        self.nombre = nombre
+        self.filas_entrada = _filas(filas_entrada)
+        self.filas_salida = None
+
+    def salida(self, resultado):
+        """Registra las filas de un DataFrame (o un entero) y lo devuelve"""
+        self.filas_salida = _filas(resultado)
+        return resultado
+
+
+class Perfil:
+    """
+    Registros de las etapas medidas mientras el perfil está activo
+    """
+
+    def __init__(self):
+        self.registros = []
+
+    def __len__(self):
+        return len(self.registros)
+
+    def activar(self):
+        """
+        Activa el perfil en el contexto actual sin desactivarlo al salir (para
+        scripts como la página de Streamlit, que corre cada rerun en su hilo)
+        """
+        _perfil_activo.set(self)
+        return self
+
+    @contextmanager
+    def activo(self):
+        token = _perfil_activo.set(self)
+        try:
+            yield self
+        finally:
+            _perfil_activo.reset(token)
+
+    def tabla(self):
+        """Un registro por etapa medida, en el orden en que terminaron"""
+        return pd.DataFrame(self.registros, columns=COLUMNAS_PERFIL)
+
+    def resumen(self):
+        """Etapas agregadas por nombre (las de bloques o reruns se suman), de la más lenta a la más rápida"""
+        tabla = self.tabla()
+        if tabla.empty:
+            return tabla
+        suma = lambda serie: serie.sum(min_count=1)  # etapas sin filas registradas quedan en NaN
+        return (tabla.groupby('etapa', sort=False)
+                .agg(veces=('segundos', 'size'), segundos=('segundos', 'sum'),
+                     filas_entrada=('filas_entrada', suma), filas_salida=('filas_salida', suma),
+                     memoria_delta_mb=('memoria_delta_mb', 'sum'))
+                .sort_values('segundos', ascending=False)
+                .reset_index())
+
+
+@contextmanager
+def etapa(nombre, filas_entrada=None):
+    """
+    Mide una etapa: la agrega al perfil activo (si hay uno) y la emite como una
+    línea JSON en el logger 'scoring.perfil'
+
+        with etapa('clasificacion', df) as m:
+            df = m.salida(clasificar_precios(df))
+    """
+    medicion = Medicion(nombre, filas_entrada)
+    memoria_inicio = memoria_proceso_mb()
+    inicio = time.time()
+    t0 = time.perf_counter()
+    try:
+        yield medicion
+    finally:
+        registro = {
+            'etapa': nombre,
+            'segundos': time.perf_counter() - t0,
+            'filas_entrada': medicion.filas_entrada,
+            'filas_salida': medicion.filas_salida,
+            'memoria_inicio_mb': memoria_inicio,
+            'memoria_delta_mb': memoria_proceso_mb() - memoria_inicio,
+            'inicio': inicio,
+        }
+        perfil = _perfil_activo.get()
+        if perfil is not None:
+            perfil.registros.append(registro)
+        if logger.isEnabledFor(logging.INFO):
+            logger.info(json.dumps(registro, default=str))
+
+
+def configurar_logs_json(ruta=None):
+    """
+    Envía los registros de etapas (una línea JSON cada uno) a un archivo, o a
+    stderr si ruta es '-'. Sin ruta usa la variable SCORING_PERFIL_LOG y, si no
+    está definida, no hace nada.
+    """
+    ruta = ruta or os.environ.get('SCORING_PERFIL_LOG')
+    if not ruta or getattr(logger, '_configurado', None) == ruta:
+        return
+
+    handler = logging.StreamHandler() if ruta == '-' else logging.FileHandler(ruta, encoding='utf-8')
+    handler.setFormatter(logging.Formatter('%(message)s'))
+    logger.addHandler(handler)
+    logger.setLevel(logging.INFO)
+    logger.propagate = False
+    logger._configurado = ruta
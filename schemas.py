@@ -0,0 +1,122 @@
+"""
+Esquemas de tipos de los CSV de entrada y lectura compacta de cada archivo
+"""
+import numpy as np
+import pandas as pd
+
+from scoring_engine import memoria_mb
+
+# Los ids van a int32 (super_catalog_id es un EAN de 13 dígitos y necesita int64),
+# los textos repetidos a category y los importes se mantienen en float64 porque
+# float32 cambia los totales de ahorro en centavos.
+ESQUEMAS = {
+    'vendors_catalog.csv': {
+        'vendor_id': 'int32',
+        'super_catalog_id': 'int64',
+        'name': 'category',
+        'base_price': 'float64',
+        'percentage': 'float64',
+    },
+    'vendor_pos_relations.csv': {
+        'point_of_sale_id': 'int32',
+        'vendor_id': 'int32',
+        'status': 'int8',
+    },
+    'pos_address.csv': {
+        'point_of_sale_id': 'int32',
+        'address': 'object',
+        'geo_zone': 'category',
+    },
+    'minimum_purchase.csv': {
+        'id': 'int32',
+        'vendor_id': 'int32',
+        'name': 'category',
+        'min_purchase': 'float64',
+        'shipping_cost': 'float64',
+        'min_free_delivery': 'float64',
+    },
+    'vendors_dm.csv': {
+        'vendor_id': 'int32',
+        'name': 'category',
+        'drug_manufacturer_id': 'int32',
+    },
+    'orders_delivered_pos_vendor_geozone.csv': {
+        'order_id': 'int32',
+        'point_of_sale_id': 'int32',
+        'vendor_id': 'int32',
+        'super_catalog_id': 'int64',
+        'unidades_pedidas': 'int32',
+        'precio_minimo': 'float64',
+        'valor_vendedor': 'float64',
+        'total_compra': 'float64',
+        'country': 'category',
+        'geo_zone': 'category',
+    },
+}
+
+
+def _es_entero(dtype):
+    return dtype.startswith('int')
+
+
+def convertir_entero(serie, dtype):
+    """
+    Convierte una serie al entero indicado solo si no tiene nulos y sus valores
+    entran en el rango del tipo; si no, la deja como está
+    """
+    if serie.isna().any() or not pd.api.types.is_numeric_dtype(serie):
+        return serie
+
+    valores = serie.to_numpy()
+    if len(valores) and not np.array_equal(valores, np.floor(valores)):
+        return serie
+
+    limites = np.iinfo(dtype)
+    if len(valores) and (valores.min() < limites.min or valores.max() > limites.max):
+        return serie
+
+    return serie.astype(dtype)
+
+
+def aplicar_esquema(df, esquema):
+    """
+    Aplica un esquema a un DataFrame ya leído (las columnas ausentes se ignoran)
+    """
+    for columna, dtype in esquema.items():
+        if columna not in df.columns or df[columna].dtype == dtype:
+            continue
+        if _es_entero(dtype):
+            df[columna] = convertir_entero(df[columna], dtype)
+        else:
+            df[columna] = df[columna].astype(dtype)
+    return df
+
+
+def leer_csv_tipado(ruta, esquema=None, renombrar=None):
+    """
+    Lee un CSV con su esquema explícito: textos y floats se tipan al parsear y
+    los enteros se reducen después, para tolerar nulos en columnas de ids
+    """
+    esquema = esquema if esquema is not None else ESQUEMAS.get(ruta, {})
+    dtype_lectura = {col: dtype for col, dtype in esquema.items() if not _es_entero(dtype)}
+
+    df = pd.read_csv(ruta, dtype=dtype_lectura)
+    if renombrar:
+        df = df.rename(columns=renombrar)
+
+    return aplicar_esquema(df, esquema)
+
+
+def reporte_memoria(frames):
+    """
+    Filas, columnas y memoria (MB, incluyendo strings) de cada frame de un dict
+    """
+    return pd.DataFrame([
+        {
+            'frame': nombre,
+            'filas': len(df),
+            'columnas': len(df.columns),
+            'memoria_mb': memoria_mb(df),
+        }
+        for nombre, df in frames.items()
+    ])
@@ -0,0 +1,154 @@
+"""
+API del motor de scoring para uso programático (scripts, notebooks, batch):
+carga los frames del pipeline, construye los índices por POS y responde las
+consultas de la página sin importar Streamlit ni librerías de gráficos.
+
+    from scoring_api import MotorScoring
+    motor = MotorScoring()
+    motor.analisis_productos(motor.pos_disponibles[0])
+"""
+import pandas as pd
+
+import pipeline
+from basket_optimizer import optimizar_canastas
+from landed_cost import condiciones_compra
+from pipeline import NOMBRES_FRAMES, cargar_datos
+from scoring_engine import (
+    IndicePOS,
+    IndiceStatus,
+    alternativas_top_k,
+    analizar_productos_pos,
+    analizar_vendors_pos,
+    calcular_impacto_activacion,
+    columna_drogueria,
+    columna_vendor,
+    detalle_compras_pos,
+    kpis_ahorro_por_pos,
+    recomendaciones_pos,
+    resumen_mejores_vendors,
+)
+
+
+def construir_indices(frames, indice_catalogo=None, clasificado=None):
+    """
+    Índices por POS sobre los frames del pipeline (en el orden de NOMBRES_FRAMES).
+    clasificado reemplaza al índice de df_clasificado (por ejemplo, un ClasificadoSQL).
+    """
+    pos_vendor_totals, df_original, pos_order_stats, _, _, pos_geo_zones, df_clasificado, df_vendors_pos, kpis_ahorro = frames
+
+    paises = pd.DataFrame()
+    if 'point_of_sale_id' in df_original.columns and 'country' in df_original.columns:
+        paises = df_original[['point_of_sale_id', 'country']].drop_duplicates('point_of_sale_id')
+
+    return {
+        'clasificado': clasificado if clasificado is not None else IndicePOS(df_clasificado),
+        'vendor_totals': IndicePOS(pos_vendor_totals),
+        'order_stats': IndicePOS(pos_order_stats),
+        'geo_zones': IndicePOS(pos_geo_zones),
+        'paises': IndicePOS(paises),
+        'status': IndiceStatus(df_vendors_pos),
+        'kpis': IndicePOS(kpis_ahorro),
+        'catalogo': indice_catalogo,
+    }
+
+
+class MotorScoring:
+    """
+    Frames del pipeline más sus índices, con una consulta por cada sección de la
+    página. Sin frames, los carga con cargar_datos (caché en disco incluida).
+    Con el backend sqlite las ofertas clasificadas de cada POS se leen de la base.
+    """
+
+    def __init__(self, frames=None, indice_catalogo=None):
+        if frames is None:
+            frames = cargar_datos(indice_catalogo=indice_catalogo)
+        self.frames = dict(zip(NOMBRES_FRAMES, frames))
+
+        self.condiciones = condiciones_compra(self.frames['df_min_purchase'])
+
+        clasificado = None
+        if pipeline.BACKEND == 'sqlite' and not all(df.empty for df in frames):
+            from sql_backend import ClasificadoSQL
+            clasificado = ClasificadoSQL(condiciones=self.condiciones)
+        self.indices = construir_indices(frames, indice_catalogo, clasificado)
+
+    @property
+    def pos_disponibles(self):
+        return self.indices['vendor_totals'].claves
+
+    def clasificado(self, pos):
+        """Ofertas clasificadas del POS"""
+        return self.indices['clasificado'].obtener(pos)
+
+    def resumen_pos(self, pos):
+        """
+        Métricas de "Información del Punto de Venta": total comprado, promedio y
+        número de órdenes, país, zona geográfica y cantidad de vendors
+        """
+        pos_data = self.indices['vendor_totals'].obtener(pos)
+        pos_stats = self.indices['order_stats'].obtener(pos)
+        pos_info = self.indices['geo_zones'].obtener(pos)
+        pos_country = self.indices['paises'].obtener(pos)
+
+        return {
+            'total_compras': pos_data['total_compra'].sum() if not pos_data.empty else 0.0,
+            'promedio_por_orden': pos_stats.iloc[0]['promedio_por_orden'] if not pos_stats.empty else 0,
+            'numero_ordenes': int(pos_stats.iloc[0]['numero_ordenes']) if not pos_stats.empty else 0,
+            'pais': (pos_country['country'].iloc[0]
+                     if not pos_country.empty and 'country' in pos_country.columns else 'No disponible'),
+            'geo_zone': (pos_info['geo_zone'].iloc[0]
+                         if not pos_info.empty and 'geo_zone' in pos_info.columns else 'No disponible'),
+            'total_vendors': len(pos_data),
+        }
+
+    def detalle_compras(self, pos):
+        """Compras por droguería/vendor con su porcentaje del total"""
+        return detalle_compras_pos(self.indices['vendor_totals'].obtener(pos))
+
+    def kpis(self, pos):
+        """KPIs del dashboard ejecutivo de ahorro (None si el POS no tiene ofertas)"""
+        kpis_pos = self.indices['kpis'].obtener(pos)
+        if kpis_pos.empty:
+            kpis_pos = kpis_ahorro_por_pos(self.clasificado(pos))
+        return kpis_pos.iloc[0].to_dict() if not kpis_pos.empty else None
+
+    def analisis_vendors(self, pos):
+        """Tabla de la pestaña "Análisis por Vendor" """
+        df_pos = self.clasificado(pos)
+        return analizar_vendors_pos(df_pos, pos, self.indices['status'], columna_vendor(df_pos))
+
+    def analisis_productos(self, pos):
+        """Tabla de la pestaña "Análisis Detallado por Producto" """
+        df_pos = self.clasificado(pos)
+        return analizar_productos_pos(df_pos, columna_vendor(df_pos), columna_drogueria(df_pos))
+
+    def mejores_vendors(self, pos):
+        """Vendors que aparecen más como mejor opción en el análisis por producto"""
+        df_producto_analysis = self.analisis_productos(pos)
+        if df_producto_analysis.empty:
+            return pd.DataFrame()
+        return resumen_mejores_vendors(df_producto_analysis)
+
+    def alternativas(self, pos, k=3):
+        """Las k ofertas de vendor más baratas de cada línea de pedido"""
+        df_pos = self.clasificado(pos)
+        return alternativas_top_k(df_pos, k, columna_vendor(df_pos))
+
+    def recomendaciones(self, pos, umbral_ahorro=0.1):
+        """Recomendaciones de cambio de vendor del POS"""
+        return recomendaciones_pos(self.clasificado(pos), umbral_ahorro)
+
+    def canasta_optima(self, pos, incluir_pendientes=False):
+        """
+        Asignación de cada línea de las órdenes del POS a un vendor activo (o
+        pendiente) que minimiza el costo puesto con compras mínimas y envíos:
+        (resumen por orden, asignación por línea)
+        """
+        return optimizar_canastas(self.clasificado(pos), self.condiciones, incluir_pendientes)
+
+    def impacto_activacion(self, pos):
+        """Ahorro potencial de activar los vendors pendientes o rechazados"""
+        df_pos = self.clasificado(pos)
+        if df_pos.empty:
+            return pd.DataFrame()
+        return calcular_impacto_activacion(df_pos)
@@ -0,0 +1,924 @@
+"""
+Motor de cálculo de oportunidades de ahorro, sin dependencias de Streamlit
+"""
+import numpy as np
+import pandas as pd
+
+# Etiquetas de clasificación de precios
+CLASIFICACION_DROGUERIA = "Precio droguería minimo"
+CLASIFICACION_VENDOR_MINIMO = "Precio vendor minimo"
+CLASIFICACION_VENDOR_NO_MINIMO = "Precio vendor no minimo"
+
+CLASIFICACIONES_VENDOR = [CLASIFICACION_VENDOR_MINIMO, CLASIFICACION_VENDOR_NO_MINIMO]
+CATEGORIAS_CLASIFICACION = ["", CLASIFICACION_DROGUERIA, CLASIFICACION_VENDOR_MINIMO, CLASIFICACION_VENDOR_NO_MINIMO]
+
+COLUMNAS_CLASIFICACION = ['order_id', 'super_catalog_id', 'precio_minimo', 'precio_vendedor']
+
+
+def get_status_description(status):
+    """
+    Convierte un código de status numérico en su descripción correspondiente
+    """
+    if pd.isna(status): 
+        return "Sin Status"
+    
+    status_map = {
+        0: "Rechazado", 
+        1: "Activo", 
+        2: "Pendiente",
+        -1: "Sin conectar"
+    }
+    
+    return status_map.get(status, f"Status {status}")
+
+
+def columna_vendor(df):
+    """
+    Columna con el vendor del catálogo (vendor_id_y si los pedidos traen su propio vendor_id)
+    """
+    if 'vendor_id_y' in df.columns:
+        return 'vendor_id_y'
+    if 'vendor_id' in df.columns:
+        return 'vendor_id'
+    return None
+
+
+def columna_drogueria(df):
+    """
+    Columna con la droguería a la que se compró realmente
+    """
+    if 'vendor_id_x' in df.columns:
+        return 'vendor_id_x'
+    if 'drug_manufacturer_id' in df.columns:
+        return 'drug_manufacturer_id'
+    return None
+
+
+def _difundir_primero(df, claves, columna):
+    """
+    Valor de la primera fila de cada grupo difundido a todas las filas del grupo.
+    A diferencia de groupby.transform('first') no salta NaN (equivale a iloc[0]);
+    las filas con claves nulas quedan en NaN.
+    """
+    codigos = df.groupby(claves, sort=False).ngroup().to_numpy()
+    validos = codigos >= 0
+    valores = df[columna].to_numpy(dtype=float)
+
+    posiciones_validas = np.flatnonzero(validos)
+    _, primeras = np.unique(codigos[validos], return_index=True)
+    resultado = np.full(len(df), np.nan)
+    resultado[posiciones_validas] = valores[posiciones_validas[primeras]][codigos[validos]]
+    return resultado
+
+
+def clasificar_precios(df):
+    """
+    Clasifica cada oferta según las reglas de precio usando operaciones vectorizadas.
+
+    Para cada grupo (order_id, super_catalog_id) se toma el precio_minimo de la
+    primera fila del grupo y el mínimo de precio_vendedor del grupo:
+    - precio_minimo < precio_vendedor -> "Precio droguería minimo"
+    - precio_vendedor == mínimo del grupo -> "Precio vendor minimo"
+    - en otro caso -> "Precio vendor no minimo"
+
+    Las comparaciones con NaN son falsas, igual que en el recorrido fila a fila,
+    y las filas con claves nulas quedan sin clasificar ("").
+    """
+    if df.empty:
+        return df
+
+    result_df = df.copy()
+    claves = ['order_id', 'super_catalog_id']
+
+    validos = (result_df['order_id'].notna() & result_df['super_catalog_id'].notna()).to_numpy()
+    precio_vendedor = result_df['precio_vendedor'].to_numpy(dtype=float)
+
+    # Mínimo de precio_vendedor por grupo difundido a cada fila (ignora NaN)
+    min_precio_vendedor = (result_df.groupby(claves, sort=False)['precio_vendedor']
+                           .transform('min')
+                           .to_numpy(dtype=float))
+
+    # precio_minimo de la primera fila de cada grupo (aunque sea NaN)
+    precio_minimo_grupo = _difundir_primero(result_df, claves, 'precio_minimo')
+
+    with np.errstate(invalid='ignore'):
+        es_drogueria = precio_minimo_grupo < precio_vendedor
+        es_vendor_minimo = precio_vendedor == min_precio_vendedor
+
+    clasificacion = np.select(
+        [~validos, es_drogueria, es_vendor_minimo],
+        ["", CLASIFICACION_DROGUERIA, CLASIFICACION_VENDOR_MINIMO],
+        default=CLASIFICACION_VENDOR_NO_MINIMO
+    )
+    result_df['clasificacion'] = pd.Categorical(clasificacion, categories=CATEGORIAS_CLASIFICACION)
+
+    return result_df
+
+
+def clasificar_precios_iterativo(df):
+    """
+    Implementación original fila a fila de la clasificación.
+    Se conserva como referencia para verificar y medir clasificar_precios.
+    """
+    if df.empty:
+        return df
+
+    result_df = df.copy()
+    result_df['clasificacion'] = ""
+
+    grupos = result_df.groupby(['order_id', 'super_catalog_id'])
+
+    for (order_id, product_id), group in grupos:
+        precio_minimo = group['precio_minimo'].iloc[0]
+        min_precio_vendedor = group['precio_vendedor'].min()
+
+        for idx in group.index:
+            precio_vendedor = result_df.loc[idx, 'precio_vendedor']
+
+            if precio_minimo < precio_vendedor:
+                result_df.loc[idx, 'clasificacion'] = CLASIFICACION_DROGUERIA
+            else:
+                if precio_vendedor == min_precio_vendedor:
+                    result_df.loc[idx, 'clasificacion'] = CLASIFICACION_VENDOR_MINIMO
+                else:
+                    result_df.loc[idx, 'clasificacion'] = CLASIFICACION_VENDOR_NO_MINIMO
+
+    return result_df
+
+
+def agregar_clasificacion(df, avisar=print):
+    """
+    Clasifica las ofertas con clasificar_precios; si faltan columnas avisa con la
+    función recibida y deja la clasificación vacía
+    """
+    if df.empty:
+        return df
+
+    missing_cols = [col for col in COLUMNAS_CLASIFICACION if col not in df.columns]
+    if missing_cols:
+        avisar(f"Columnas faltantes para clasificación: {missing_cols}")
+        result_df = df.copy()
+        result_df['clasificacion'] = ""
+        return result_df
+
+    return clasificar_precios(df)
+
+
+def memoria_mb(df):
+    """
+    Memoria ocupada por un DataFrame en MB (incluye el contenido de columnas object)
+    """
+    return df.memory_usage(deep=True).sum() / 1024 ** 2
+
+
+def adjuntar_status_relacion(df, df_vendors_pos, vendor_col):
+    """
+    Agrega el status de la relación vendor-POS a cada oferta con un lookup por
+    la clave (point_of_sale_id, vendor), manteniendo una fila por oferta.
+
+    La columna vendor_id resultante es la del vendor de la relación (NaN si el
+    POS no tiene relación con el vendor de la oferta).
+    """
+    relaciones = (df_vendors_pos[['point_of_sale_id', 'vendor_id', 'status']]
+                  .drop_duplicates(['point_of_sale_id', 'vendor_id'], keep='first'))
+
+    return pd.merge(
+        df, relaciones,
+        left_on=['point_of_sale_id', vendor_col],
+        right_on=['point_of_sale_id', 'vendor_id'],
+        how='left',
+        validate='many_to_one'
+    )
+
+
+def diagnostico_join_relaciones(df_antes, df_despues, df_vendors_pos):
+    """
+    Filas y memoria antes y después del join con vendor_pos_relations, junto con
+    lo que hubiera producido el join solo por point_of_sale_id
+    """
+    filas_antes = len(df_antes)
+    filas_despues = len(df_despues)
+    memoria_antes = memoria_mb(df_antes)
+    memoria_despues = memoria_mb(df_despues)
+
+    # El join solo por POS repetía cada fila una vez por relación del POS
+    relaciones_por_pos = df_vendors_pos.groupby('point_of_sale_id').size()
+    filas_join_pos = int(df_antes['point_of_sale_id'].map(relaciones_por_pos).fillna(1).sum())
+    memoria_por_fila = memoria_despues / filas_despues if filas_despues else 0
+
+    return {
+        'filas_antes': filas_antes,
+        'filas_despues': filas_despues,
+        'memoria_antes_mb': memoria_antes,
+        'memoria_despues_mb': memoria_despues,
+        'filas_join_solo_pos': filas_join_pos,
+        'memoria_join_solo_pos_mb': filas_join_pos * memoria_por_fila,
+    }
+
+
+class IndicePOS:
+    """
+    Índice de particiones por point_of_sale_id.
+
+    El frame se ordena una sola vez por POS (orden estable, conserva el orden
+    original dentro de cada POS) y se guarda una tabla de offsets, de modo que
+    obtener las filas de un POS es un slice contiguo sin máscaras ni copias.
+    """
+
+    def __init__(self, df, columna='point_of_sale_id'):
+        self.columna = columna
+
+        if df.empty or columna not in df.columns:
+            self.df = df
+            self.offsets = pd.DataFrame(columns=[columna, 'inicio', 'fin'])
+            self._posiciones = {}
+            return
+
+        if not df[columna].is_monotonic_increasing:
+            df = df.sort_values(columna, kind='stable')
+        self.df = df
+
+        valores = df[columna].to_numpy()
+        inicios = np.flatnonzero(np.r_[True, valores[1:] != valores[:-1]])
+        fines = np.r_[inicios[1:], len(valores)]
+
+        self.offsets = pd.DataFrame({columna: valores[inicios], 'inicio': inicios, 'fin': fines})
+        self._posiciones = dict(zip(valores[inicios].tolist(), zip(inicios.tolist(), fines.tolist())))
+
+    @property
+    def empty(self):
+        return self.df.empty
+
+    @property
+    def claves(self):
+        """
+        Lista ordenada de los POS presentes en el índice
+        """
+        return list(self._posiciones)
+
+    def __contains__(self, pos):
+        return pos in self._posiciones
+
+    def __len__(self):
+        return len(self.df)
+
+    def obtener(self, pos):
+        """
+        Filas del POS como slice del frame ordenado (vacío si el POS no existe)
+        """
+        inicio, fin = self._posiciones.get(pos, (0, 0))
+        return self.df.iloc[inicio:fin]
+
+
+class IndiceStatus:
+    """
+    Índice hash del status de la relación vendor-POS por (vendor_id, point_of_sale_id).
+
+    Se construye una vez a partir de vendor_pos_relations (ids normalizados a numérico,
+    primera relación por par) y resuelve tanto consultas escalares como vectorizadas
+    sobre arreglos de pares. Los pares sin relación devuelven NaN.
+    """
+
+    def __init__(self, df_vendors_pos):
+        columnas = ['vendor_id', 'point_of_sale_id', 'status']
+        if df_vendors_pos.empty or any(col not in df_vendors_pos.columns for col in columnas):
+            relaciones = pd.DataFrame({col: pd.Series(dtype=float) for col in columnas})
+        else:
+            relaciones = pd.DataFrame({
+                'vendor_id': pd.to_numeric(df_vendors_pos['vendor_id'], errors='coerce'),
+                'point_of_sale_id': pd.to_numeric(df_vendors_pos['point_of_sale_id'], errors='coerce'),
+                'status': df_vendors_pos['status'],
+            })
+            relaciones = (relaciones
+                          .dropna(subset=['vendor_id', 'point_of_sale_id'])
+                          .drop_duplicates(['vendor_id', 'point_of_sale_id'], keep='first'))
+
+        vendors = relaciones['vendor_id'].to_numpy(dtype=float)
+        puntos = relaciones['point_of_sale_id'].to_numpy(dtype=float)
+        self._status = relaciones['status'].to_numpy(dtype=float)
+        self._indice = pd.MultiIndex.from_arrays([vendors, puntos])
+        self._mapa = dict(zip(zip(vendors.tolist(), puntos.tolist()), relaciones['status'].tolist()))
+
+    def __len__(self):
+        return len(self._mapa)
+
+    def obtener(self, vendor_id, pos_id):
+        """
+        Status de un par (vendor, POS) o NaN si no hay relación
+        """
+        vendor_id = pd.to_numeric(vendor_id, errors='coerce')
+        pos_id = pd.to_numeric(pos_id, errors='coerce')
+        if pd.isna(vendor_id) or pd.isna(pos_id):
+            return np.nan
+        return self._mapa.get((float(vendor_id), float(pos_id)), np.nan)
+
+    def obtener_vector(self, vendor_ids, pos_ids):
+        """
+        Status para arreglos de pares (vendor, POS); un POS escalar se aplica a
+        todos los vendors. Devuelve un arreglo float con NaN donde no hay relación.
+        """
+        vendor_ids = pd.to_numeric(pd.Series(np.asarray(vendor_ids)), errors='coerce').to_numpy(dtype=float)
+        pos_ids = pd.to_numeric(pd.Series(np.broadcast_to(np.asarray(pos_ids), vendor_ids.shape)),
+                                errors='coerce').to_numpy(dtype=float)
+        if len(vendor_ids) == 0 or len(self._status) == 0:
+            return np.full(len(vendor_ids), np.nan)
+
+        posiciones = self._indice.get_indexer(pd.MultiIndex.from_arrays([vendor_ids, pos_ids]))
+        return np.where(posiciones >= 0, self._status[posiciones], np.nan)
+
+
+def seleccionar_pos(datos, pos):
+    """
+    Filas de un POS a partir de un índice (IndicePOS o ClasificadoSQL) o, si se
+    recibe un DataFrame, con una máscara sobre point_of_sale_id
+    """
+    if not isinstance(datos, pd.DataFrame):
+        return datos.obtener(pos)
+    return datos[datos['point_of_sale_id'] == pos]
+
+
+def detalle_compras_pos(pos_data):
+    """
+    Tabla "Detalle de Compras por Droguería/Vendor" a partir de las filas de
+    pos_vendor_totals de un POS, con el porcentaje de cada droguería/vendor
+    """
+    if pos_data.empty:
+        return pd.DataFrame()
+
+    detail_table = pos_data.sort_values('total_compra', ascending=False)
+    detail_table = detail_table.assign(porcentaje=detail_table['total_compra'] / detail_table['total_compra'].sum() * 100)
+    detail_table.columns = ['POS ID', 'Droguería/Vendor ID', 'Total Comprado', 'Porcentaje']
+    return detail_table.round({'Porcentaje': 2})
+
+
+def precio_drogueria_por_linea(df_pos):
+    """
+    Precio actual pagado a la droguería por (super_catalog_id, order_id): la primera
+    fila clasificada como "Precio droguería minimo" de cada línea de pedido
+    """
+    return (df_pos[df_pos['clasificacion'] == CLASIFICACION_DROGUERIA]
+            .drop_duplicates(['super_catalog_id', 'order_id']))
+
+
+def analizar_vendors_pos(df_pos, selected_pos, df_vendors_pos, vendor_col=None):
+    """
+    Tabla de la pestaña "Análisis por Vendor" para un POS.
+
+    Une una sola vez las ofertas de vendors con el precio de droguería de su
+    línea de pedido y agrega por vendor con un único groupby. Solo se incluyen
+    vendors con valor de droguería positivo, ordenados por ahorro potencial.
+    df_vendors_pos puede ser el DataFrame de relaciones o un IndiceStatus.
+    """
+    vendor_col = vendor_col or columna_vendor(df_pos)
+    if df_pos.empty or vendor_col is None:
+        return pd.DataFrame()
+
+    ofertas = df_pos.loc[
+        df_pos['clasificacion'].isin(CLASIFICACIONES_VENDOR) & df_pos[vendor_col].notna(),
+        [vendor_col, 'super_catalog_id', 'order_id', 'precio_total_vendedor']
+    ]
+    if ofertas.empty:
+        return pd.DataFrame()
+
+    drogueria = precio_drogueria_por_linea(df_pos)[['super_catalog_id', 'order_id', 'valor_vendedor']]
+    cruce = ofertas.merge(
+        drogueria.rename(columns={'valor_vendedor': 'precio_drogueria'}),
+        on=['super_catalog_id', 'order_id'], how='inner'
+    )
+    if cruce.empty:
+        return pd.DataFrame()
+
+    cruce['mejor_precio'] = cruce['precio_total_vendedor'] < cruce['precio_drogueria']
+    cruce['drogueria_nan'] = cruce['precio_drogueria'].isna()
+    cruce['vendor_nan'] = cruce['precio_total_vendedor'].isna()
+
+    agregado = cruce.groupby(vendor_col, sort=False).agg(
+        productos=('super_catalog_id', 'nunique'),
+        ordenes=('order_id', 'nunique'),
+        mejor_precio=('mejor_precio', 'sum'),
+        total_drogueria=('precio_drogueria', 'sum'),
+        total_vendor=('precio_total_vendedor', 'sum'),
+        drogueria_nan=('drogueria_nan', 'any'),
+        vendor_nan=('vendor_nan', 'any'),
+    )
+    # Un NaN en la suma contamina el total, como en la acumulación fila a fila
+    agregado.loc[agregado['drogueria_nan'], 'total_drogueria'] = np.nan
+    agregado.loc[agregado['vendor_nan'], 'total_vendor'] = np.nan
+
+    # Mantener el orden de aparición de los vendors en las ofertas
+    orden = pd.unique(ofertas[vendor_col])
+    agregado = agregado.reindex([v for v in orden if v in agregado.index])
+    agregado = agregado[agregado['total_drogueria'] > 0]
+    if agregado.empty:
+        return pd.DataFrame()
+
+    ahorro = agregado['total_drogueria'] - agregado['total_vendor']
+    porcentaje = ahorro / agregado['total_drogueria'] * 100
+
+    indice_status = df_vendors_pos if isinstance(df_vendors_pos, IndiceStatus) else IndiceStatus(df_vendors_pos)
+    status = indice_status.obtener_vector(agregado.index, selected_pos)
+
+    df_vendor_analysis = pd.DataFrame({
+        'Vendor ID': agregado.index.astype(int),
+        'Status': describir_status(pd.Series(status)).to_numpy(),
+        'Productos Únicos': agregado['productos'].to_numpy(),
+        'Órdenes Afectadas': agregado['ordenes'].to_numpy(),
+        'Registros con Mejor Precio': agregado['mejor_precio'].to_numpy(),
+        'Valor Actual (Droguería)': agregado['total_drogueria'].to_numpy(),
+        'Valor con Vendor': agregado['total_vendor'].to_numpy(),
+        'Ahorro Potencial': ahorro.to_numpy(),
+        'Porcentaje Ahorro': porcentaje.to_numpy(),
+        'Clasificación': np.select(
+            [porcentaje.to_numpy() > 15, porcentaje.to_numpy() > 5],
+            ['Oportunidad Alta', 'Oportunidad Media'],
+            default='Oportunidad Baja'
+        ),
+    })
+
+    return df_vendor_analysis.sort_values('Ahorro Potencial', ascending=False)
+
+
+def describir_status(status):
+    """
+    Versión vectorizada de get_status_description para una serie de status
+    """
+    mapa = {valor: get_status_description(valor) for valor in pd.unique(status.dropna())}
+    return status.map(mapa).fillna("Sin Status")
+
+
+def _rankear_ofertas(ofertas):
+    """
+    Ordena las ofertas de vendors por precio total dentro de cada línea y agrega
+    su ranking (1 = más barata). A igual precio se mantiene el orden original.
+    """
+    ofertas = ofertas.sort_values('precio_total_vendedor', kind='stable', na_position='last')
+    return ofertas.assign(_rank=ofertas.groupby(['super_catalog_id', 'order_id'], sort=False).cumcount() + 1)
+
+
+def analizar_productos_pos(df_pos, vendor_col=None, drogueria_col=None):
+    """
+    Tabla de la pestaña "Análisis Detallado por Producto" para un POS.
+
+    Resuelve en una sola pasada el mejor vendor de cada (super_catalog_id, order_id)
+    con oferta de vendor y precio de droguería, ordenada por ahorro con el mejor vendor.
+    """
+    vendor_col = vendor_col or columna_vendor(df_pos)
+    drogueria_col = drogueria_col or columna_drogueria(df_pos)
+    claves = ['super_catalog_id', 'order_id']
+
+    if df_pos.empty or vendor_col is None:
+        return pd.DataFrame()
+
+    filas_vendor = df_pos[df_pos['clasificacion'].isin(CLASIFICACIONES_VENDOR)]
+    if filas_vendor.empty:
+        return pd.DataFrame()
+    ofertas = _rankear_ofertas(filas_vendor)
+
+    # Líneas en orden de aparición: producto y luego orden dentro del producto
+    lineas = filas_vendor.drop_duplicates(claves)[claves]
+    lineas = lineas.assign(_orden_producto=pd.factorize(lineas['super_catalog_id'])[0])
+    lineas = lineas.sort_values('_orden_producto', kind='stable')
+
+    drogueria = precio_drogueria_por_linea(df_pos)
+    columnas_drogueria = claves + ['valor_vendedor', 'unidades_pedidas', 'precio_minimo']
+    if drogueria_col is not None:
+        columnas_drogueria.append(drogueria_col)
+    lineas = lineas.merge(drogueria[columnas_drogueria], on=claves, how='inner')
+    if lineas.empty:
+        return pd.DataFrame()
+
+    mejores = ofertas[ofertas['_rank'] == 1]
+    columnas_mejor = claves + [vendor_col, 'precio_vendedor', 'precio_total_vendedor']
+    if 'status' in mejores.columns:
+        columnas_mejor.append('status')
+    opciones = ofertas.groupby(claves, sort=False).size().rename('opciones').reset_index()
+    lineas = (lineas
+              .merge(mejores[columnas_mejor].rename(columns={vendor_col: '_mejor_vendor', 'status': '_status'}),
+                     on=claves, how='left')
+              .merge(opciones, on=claves, how='left'))
+
+    precio_drogueria = lineas['valor_vendedor'].to_numpy(dtype=float)
+    ahorro = precio_drogueria - lineas['precio_total_vendedor'].to_numpy(dtype=float)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        porcentaje = np.where(precio_drogueria > 0, ahorro / precio_drogueria * 100, 0)
+
+    status = describir_status(lineas['_status']) if '_status' in lineas.columns else "Sin Status"
+
+    df_producto_analysis = pd.DataFrame({
+        'Producto ID': lineas['super_catalog_id'],
+        'Orden ID': lineas['order_id'],
+        'Unidades': lineas['unidades_pedidas'],
+        'Droguería ID': lineas[drogueria_col] if drogueria_col is not None else np.nan,
+        'Precio Unit. Droguería': lineas['precio_minimo'],
+        'Precio Total Droguería': lineas['valor_vendedor'],
+        'Opciones Vendors': lineas['opciones'],
+        'Mejor Vendor ID': lineas['_mejor_vendor'],
+        'Status Mejor Vendor': status,
+        'Precio Unit. Mejor Vendor': lineas['precio_vendedor'],
+        'Precio Total Mejor Vendor': lineas['precio_total_vendedor'],
+        'Ahorro con Mejor Vendor': ahorro,
+        'Porcentaje Ahorro': porcentaje,
+        'Tipo Ahorro': np.select([porcentaje > 20, porcentaje > 10], ['Alto', 'Medio'], default='Bajo'),
+    })
+
+    return df_producto_analysis.sort_values('Ahorro con Mejor Vendor', ascending=False)
+
+
+def resumen_mejores_vendors(df_producto_analysis):
+    """
+    Vendors que aparecen como mejor opción en el análisis por producto: cantidad
+    de productos y ahorro total y promedio, ordenados por ahorro total
+    """
+    vendor_frecuencia = df_producto_analysis.groupby(['Mejor Vendor ID', 'Status Mejor Vendor']).agg({
+        'Producto ID': 'count',
+        'Ahorro con Mejor Vendor': ['sum', 'mean']
+    }).round(2)
+
+    vendor_frecuencia.columns = ['Productos Como Mejor Opción', 'Ahorro Total', 'Ahorro Promedio']
+    return vendor_frecuencia.reset_index().sort_values('Ahorro Total', ascending=False)
+
+
+def alternativas_top_k(df_pos, k=3, vendor_col=None):
+    """
+    Las k ofertas de vendor más baratas de cada (super_catalog_id, order_id) del POS,
+    con su ranking, la diferencia contra la mejor oferta, el ahorro contra el precio
+    de droguería (NaN si la línea no tiene precio de droguería) y el status del vendor.
+    """
+    vendor_col = vendor_col or columna_vendor(df_pos)
+    claves = ['super_catalog_id', 'order_id']
+
+    if df_pos.empty or vendor_col is None:
+        return pd.DataFrame()
+
+    filas_vendor = df_pos[df_pos['clasificacion'].isin(CLASIFICACIONES_VENDOR)]
+    if filas_vendor.empty:
+        return pd.DataFrame()
+    ofertas = _rankear_ofertas(filas_vendor)
+
+    mejor_precio = ofertas.groupby(claves, sort=False)['precio_total_vendedor'].transform('first')
+    ofertas = ofertas.assign(_diferencia=ofertas['precio_total_vendedor'] - mejor_precio)
+    ofertas = ofertas[ofertas['_rank'] <= k]
+
+    drogueria = precio_drogueria_por_linea(df_pos)[claves + ['valor_vendedor']]
+    ofertas = ofertas.merge(drogueria.rename(columns={'valor_vendedor': '_precio_drogueria'}),
+                            on=claves, how='left')
+
+    status = describir_status(ofertas['status']) if 'status' in ofertas.columns else "Sin Status"
+
+    df_alternativas = pd.DataFrame({
+        'Producto ID': ofertas['super_catalog_id'],
+        'Orden ID': ofertas['order_id'],
+        'Rank': ofertas['_rank'],
+        'Vendor ID': ofertas[vendor_col],
+        'Status': status,
+        'Precio Unit. Vendor': ofertas['precio_vendedor'],
+        'Precio Total Vendor': ofertas['precio_total_vendedor'],
+        'Diferencia vs Mejor': ofertas['_diferencia'],
+        'Ahorro vs Droguería': ofertas['_precio_drogueria'] - ofertas['precio_total_vendedor'],
+    })
+
+    return df_alternativas.sort_values(['Producto ID', 'Orden ID', 'Rank'], ignore_index=True)
+
+
+STATUS_ACTIVO = 1
+STATUS_NO_ACTIVOS = [0, 2]
+
+
+def _ahorro_por_oferta(df_pos):
+    """
+    Ahorro de cada oferta contra el precio actual de su línea (valor_vendedor de la
+    primera fila de la línea); las ofertas sin ahorro o con precios NaN aportan 0
+    """
+    precio_actual = _difundir_primero(df_pos, ['super_catalog_id', 'order_id'], 'valor_vendedor')
+    with np.errstate(invalid='ignore'):
+        ahorro = precio_actual - df_pos['precio_total_vendedor'].to_numpy(dtype=float)
+        return np.where(ahorro > 0, ahorro, 0.0)
+
+
+def calcular_impacto_activacion(df_pos, vendor_col=None):
+    """
+    Impacto de activar cada vendor pendiente o rechazado del POS: productos donde
+    tiene el precio mínimo, ahorro potencial sumado sobre sus ofertas, productos y
+    órdenes con oferta. Ordenado por ahorro potencial.
+    """
+    vendor_col = vendor_col or columna_vendor(df_pos)
+    if df_pos.empty or vendor_col is None or 'status' not in df_pos.columns:
+        return pd.DataFrame()
+
+    ofertas = pd.DataFrame({
+        'vendor_id': df_pos[vendor_col].to_numpy(),
+        'status': df_pos['status'].to_numpy(),
+        'super_catalog_id': df_pos['super_catalog_id'].to_numpy(),
+        'order_id': df_pos['order_id'].to_numpy(),
+        'ahorro': _ahorro_por_oferta(df_pos),
+        'producto_ganador': df_pos['super_catalog_id'].where(
+            df_pos['clasificacion'] == CLASIFICACION_VENDOR_MINIMO).to_numpy(),
+    })
+
+    vendors_no_activos = pd.unique(
+        ofertas.loc[ofertas['status'].isin(STATUS_NO_ACTIVOS) & ofertas['vendor_id'].notna(), 'vendor_id'])
+    if len(vendors_no_activos) == 0:
+        return pd.DataFrame()
+
+    ofertas = ofertas[ofertas['vendor_id'].isin(vendors_no_activos)]
+    agregado = ofertas.groupby('vendor_id', sort=False).agg(
+        productos_con_mejor_precio=('producto_ganador', 'nunique'),
+        ahorro_potencial_total=('ahorro', 'sum'),
+        productos_totales=('super_catalog_id', 'nunique'),
+        ordenes_afectadas=('order_id', 'nunique'),
+    )
+    # status de la primera oferta del vendor (aunque sea NaN)
+    agregado['status'] = ofertas.drop_duplicates('vendor_id').set_index('vendor_id')['status']
+    agregado = agregado.reindex(vendors_no_activos)
+
+    df_impacto = pd.DataFrame({
+        'vendor_id': agregado.index,
+        'status_actual': describir_status(agregado['status']).to_numpy(),
+        'productos_con_mejor_precio': agregado['productos_con_mejor_precio'].to_numpy(),
+        'ahorro_potencial_total': agregado['ahorro_potencial_total'].to_numpy(),
+        'productos_totales': agregado['productos_totales'].to_numpy(),
+        'ordenes_afectadas': agregado['ordenes_afectadas'].to_numpy(),
+    })
+
+    return df_impacto.sort_values('ahorro_potencial_total', ascending=False)
+
+
+class SimuladorActivacion:
+    """
+    Simulación "what-if" de activación de vendors para un POS.
+
+    Precalcula una sola vez la contribución de ahorro de cada vendor en cada línea
+    (super_catalog_id, order_id): el ahorro de su mejor oferta contra el precio
+    actual. El ahorro alcanzable de una línea es la mejor contribución entre los
+    vendors activos, así que simular un cambio de status solo recorre las líneas
+    donde ofertan los vendors que se activan.
+    """
+
+    def __init__(self, df_pos, vendor_col=None):
+        vendor_col = vendor_col or columna_vendor(df_pos)
+        self._contribuciones = {}
+        self.vendors_activos = set()
+
+        if df_pos.empty or vendor_col is None or 'status' not in df_pos.columns:
+            self.ahorro_por_linea = np.zeros(0)
+            self.ahorro_actual = 0.0
+            return
+
+        codigos_linea = df_pos.groupby(['super_catalog_id', 'order_id'], sort=False).ngroup().to_numpy()
+        ofertas = pd.DataFrame({
+            'linea': codigos_linea,
+            'vendor_id': df_pos[vendor_col].to_numpy(),
+            'status': df_pos['status'].to_numpy(),
+            'ahorro': _ahorro_por_oferta(df_pos),
+        })
+        ofertas = ofertas[(ofertas['linea'] >= 0) & ofertas['vendor_id'].notna()]
+
+        # Mejor contribución de cada vendor en cada línea
+        contribuciones = ofertas.groupby(['vendor_id', 'linea'], sort=False)['ahorro'].max().reset_index()
+        for vendor, grupo in contribuciones.groupby('vendor_id', sort=False):
+            self._contribuciones[vendor] = (grupo['linea'].to_numpy(), grupo['ahorro'].to_numpy())
+
+        self.vendors_activos = set(ofertas.loc[ofertas['status'] == STATUS_ACTIVO, 'vendor_id'].unique())
+
+        self.ahorro_por_linea = np.zeros(codigos_linea.max() + 1 if len(codigos_linea) else 0)
+        for vendor in self.vendors_activos:
+            lineas, ahorro = self._contribuciones[vendor]
+            np.maximum.at(self.ahorro_por_linea, lineas, ahorro)
+        self.ahorro_actual = float(self.ahorro_por_linea.sum())
+
+    @property
+    def vendors(self):
+        """
+        Vendors con alguna oferta en el POS
+        """
+        return list(self._contribuciones)
+
+    def simular(self, vendors_activados):
+        """
+        Ahorro alcanzable si los vendors indicados pasan a estar activos.
+        Devuelve el ahorro actual, el simulado, el incremento y las líneas que mejoran.
+        """
+        nuevos = [v for v in vendors_activados if v in self._contribuciones and v not in self.vendors_activos]
+        if not nuevos:
+            return {
+                'ahorro_actual': self.ahorro_actual,
+                'ahorro_simulado': self.ahorro_actual,
+                'ahorro_incremental': 0.0,
+                'lineas_mejoradas': 0,
+            }
+
+        lineas = np.concatenate([self._contribuciones[v][0] for v in nuevos])
+        ahorro = np.concatenate([self._contribuciones[v][1] for v in nuevos])
+
+        # Solo se actualizan las líneas tocadas por los vendors activados
+        tocadas, posiciones = np.unique(lineas, return_inverse=True)
+        mejor_nuevo = np.zeros(len(tocadas))
+        np.maximum.at(mejor_nuevo, posiciones, ahorro)
+        incremento = np.maximum(mejor_nuevo - self.ahorro_por_linea[tocadas], 0)
+
+        ahorro_incremental = float(incremento.sum())
+        return {
+            'ahorro_actual': self.ahorro_actual,
+            'ahorro_simulado': self.ahorro_actual + ahorro_incremental,
+            'ahorro_incremental': ahorro_incremental,
+            'lineas_mejoradas': int((incremento > 0).sum()),
+        }
+
+
+COLUMNAS_KPIS = ['point_of_sale_id', 'total_comprado', 'total_optimo', 'ahorro_maximo', 'ahorro_pct',
+                 'vendors_con_ahorro', 'productos_optimizables', 'ordenes_analizadas',
+                 'vendors_activos', 'vendors_no_activos']
+
+# Conteos distintos del dashboard: nombre -> columna contada por POS
+_PARES_KPIS = {
+    'vendors_con_ahorro': 'vendor_id',
+    'productos_optimizables': 'super_catalog_id',
+    'vendors_activos': 'vendor_id',
+    'vendors_no_activos': 'vendor_id',
+}
+
+
+def kpis_parciales(df_clasificado):
+    """
+    Agregados parciales de los KPIs de ahorro de un bloque de df_clasificado.
+
+    Las sumas por POS son aditivas entre bloques; los conteos distintos se guardan
+    como pares (POS, id) para unirlos. Supone que cada orden está completa dentro
+    del bloque, como garantiza la lectura por bloques de pedidos.
+    """
+    df = df_clasificado
+    pos = 'point_of_sale_id'
+    sumas = pd.DataFrame(columns=[pos, 'total_comprado', 'total_optimo', 'ordenes_analizadas'])
+    pares = {nombre: pd.DataFrame(columns=[pos, columna]) for nombre, columna in _PARES_KPIS.items()}
+
+    if df.empty or pos not in df.columns:
+        return {'sumas': sumas, **pares}
+
+    grupos = df.groupby(pos, sort=True)
+    sumas = pd.DataFrame(index=pd.Index(grupos.size().index, name=pos))
+    sumas['total_comprado'] = grupos['valor_vendedor'].sum() if 'valor_vendedor' in df.columns else 0.0
+    if 'precio_total_vendedor' in df.columns and {'order_id', 'super_catalog_id'} <= set(df.columns):
+        sumas['total_optimo'] = (df.groupby([pos, 'order_id', 'super_catalog_id'])['precio_total_vendedor']
+                                 .min().groupby(level=pos).sum())
+        sumas['total_optimo'] = sumas['total_optimo'].fillna(0.0)
+    else:
+        sumas['total_optimo'] = 0.0
+    sumas['ordenes_analizadas'] = grupos['order_id'].nunique() if 'order_id' in df.columns else 0
+    sumas = sumas.reset_index()
+
+    mascaras = {}
+    if 'vendor_id' in df.columns and 'clasificacion' in df.columns:
+        mascaras['vendors_con_ahorro'] = df['clasificacion'].isin([CLASIFICACION_VENDOR_MINIMO,
+                                                                   CLASIFICACION_DROGUERIA])
+    if 'valor_vendedor' in df.columns and 'precio_total_vendedor' in df.columns:
+        mascaras['productos_optimizables'] = df['valor_vendedor'] > df['precio_total_vendedor']
+    if 'status' in df.columns and 'vendor_id' in df.columns:
+        mascaras['vendors_activos'] = df['status'] == STATUS_ACTIVO
+        mascaras['vendors_no_activos'] = df['status'].isin(STATUS_NO_ACTIVOS)
+
+    for nombre, mascara in mascaras.items():
+        pares[nombre] = df.loc[mascara, [pos, _PARES_KPIS[nombre]]].dropna().drop_duplicates()
+
+    return {'sumas': sumas, **pares}
+
+
+def combinar_kpis_parciales(a, b):
+    """
+    Combina dos agregados parciales de KPIs (de bloques distintos)
+    """
+    if a is None:
+        return b
+    sumas = pd.concat([a['sumas'], b['sumas']], ignore_index=True)
+    combinado = {'sumas': sumas.groupby('point_of_sale_id', as_index=False).sum()}
+    for nombre in _PARES_KPIS:
+        combinado[nombre] = pd.concat([a[nombre], b[nombre]], ignore_index=True).drop_duplicates()
+    return combinado
+
+
+def finalizar_kpis(parciales):
+    """
+    KPIs de ahorro por POS (una fila por POS, columnas COLUMNAS_KPIS) a partir de
+    los agregados parciales ya combinados
+    """
+    if parciales is None or parciales['sumas'].empty:
+        return pd.DataFrame(columns=COLUMNAS_KPIS)
+
+    kpis = parciales['sumas'].set_index('point_of_sale_id')
+    kpis['ahorro_maximo'] = kpis['total_comprado'] - kpis['total_optimo']
+    total = kpis['total_comprado'].to_numpy(dtype=float)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        kpis['ahorro_pct'] = np.where(total > 0, kpis['ahorro_maximo'].to_numpy(dtype=float) / total * 100, 0.0)
+
+    for nombre, columna in _PARES_KPIS.items():
+        conteo = parciales[nombre].groupby('point_of_sale_id')[columna].nunique()
+        kpis[nombre] = conteo.reindex(kpis.index, fill_value=0).astype('int64')
+    kpis['ordenes_analizadas'] = kpis['ordenes_analizadas'].astype('int64')
+
+    return kpis.reset_index()[COLUMNAS_KPIS].sort_values('point_of_sale_id', ignore_index=True)
+
+
+def kpis_ahorro_por_pos(df_clasificado):
+    """
+    KPIs del dashboard ejecutivo de ahorro para todos los POS en una sola pasada
+    """
+    return finalizar_kpis(kpis_parciales(df_clasificado))
+
+
+COLUMNAS_RECOMENDACIONES = ['super_catalog_id', 'order_id', 'valor_vendedor', 'vendor_id_x',
+                            'unidades_pedidas', 'precio_total_vendedor', 'vendor_id', 'status',
+                            'precio_minimo', 'precio_vendedor']
+
+
+def prioridad_ahorro(ahorro):
+    """
+    Prioridad de una recomendación según el ahorro total (vectorizado)
+    """
+    ahorro = np.asarray(ahorro, dtype=float)
+    return np.select([ahorro > 1000, ahorro > 500], ['Alta', 'Media'], default='Baja')
+
+
+def generar_recomendaciones_batch(df_clasificado, umbral_ahorro=0.1):
+    """
+    Recomendaciones de cambio de vendor para todos los POS en una sola pasada.
+
+    Para cada (point_of_sale_id, super_catalog_id, order_id) compara el precio actual
+    (primera fila de la línea) contra la oferta de menor precio_total_vendedor y
+    conserva las líneas cuyo ahorro relativo alcanza umbral_ahorro, con las mismas
+    prioridades que generar_recomendaciones_cambio_vendor.
+    """
+    claves = ['point_of_sale_id', 'super_catalog_id', 'order_id']
+    if df_clasificado.empty or any(col not in df_clasificado.columns for col in COLUMNAS_RECOMENDACIONES):
+        return pd.DataFrame()
+
+    actuales = df_clasificado.drop_duplicates(claves)[claves + ['valor_vendedor', 'vendor_id_x', 'unidades_pedidas']]
+
+    # Mejor alternativa: primera oferta de menor precio total (como idxmin)
+    mejores = (df_clasificado
+               .sort_values('precio_total_vendedor', kind='stable', na_position='last')
+               .drop_duplicates(claves)
+               [claves + ['vendor_id', 'status', 'precio_minimo', 'precio_vendedor', 'precio_total_vendedor']])
+
+    lineas = actuales.merge(mejores, on=claves, how='inner')
+
+    precio_actual = lineas['valor_vendedor'].to_numpy(dtype=float)
+    ahorro = precio_actual - lineas['precio_total_vendedor'].to_numpy(dtype=float)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        ahorro_pct = np.where(precio_actual > 0, ahorro / precio_actual, 0)
+        seleccion = ahorro_pct >= umbral_ahorro
+
+    lineas = lineas[seleccion]
+    ahorro = ahorro[seleccion]
+    ahorro_pct = ahorro_pct[seleccion]
+
+    df_recomendaciones = pd.DataFrame({
+        'point_of_sale_id': lineas['point_of_sale_id'].to_numpy(),
+        'producto_id': lineas['super_catalog_id'].to_numpy(),
+        'orden_id': lineas['order_id'].to_numpy(),
+        'unidades': lineas['unidades_pedidas'].to_numpy(),
+        'drogueria_actual': lineas['vendor_id_x'].to_numpy(),
+        'vendor_recomendado': lineas['vendor_id'].to_numpy(),
+        'status_vendor': describir_status(lineas['status']).to_numpy(),
+        'precio_actual_unitario': lineas['precio_minimo'].to_numpy(),
+        'precio_recomendado_unitario': lineas['precio_vendedor'].to_numpy(),
+        'ahorro_total': ahorro,
+        'ahorro_porcentaje': ahorro_pct * 100,
+        'prioridad': prioridad_ahorro(ahorro),
+    })
+
+    return df_recomendaciones.sort_values(['point_of_sale_id', 'ahorro_total'], ascending=[True, False],
+                                          ignore_index=True)
+
+
+def recomendaciones_pos(df_pos, umbral_ahorro=0.1):
+    """
+    Recomendaciones de cambio de vendor de un POS, ordenadas por ahorro total
+    """
+    df_recomendaciones = generar_recomendaciones_batch(df_pos, umbral_ahorro)
+
+    if not df_recomendaciones.empty:
+        df_recomendaciones = (df_recomendaciones
+                              .drop(columns=['point_of_sale_id'])
+                              .sort_values(['producto_id', 'orden_id'], ignore_index=True)
+                              .sort_values('ahorro_total', ascending=False))
+
+    return df_recomendaciones
+
+
+def guardar_tabla(df, ruta):
+    """
+    Escribe un resultado en un único archivo columnar (Parquet, o CSV si la ruta
+    termina en .csv)
+    """
+    if str(ruta).endswith('.csv'):
+        df.to_csv(ruta, index=False)
+    else:
+        df.to_parquet(ruta, index=False)
+    return ruta
+
+
+def guardar_recomendaciones(df_recomendaciones, ruta):
+    """
+    Escribe las recomendaciones en un único archivo columnar (Parquet, o CSV si la
+    ruta termina en .csv)
+    """
+    return guardar_tabla(df_recomendaciones, ruta)
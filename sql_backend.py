@@ -0,0 +1,346 @@
+"""
+Backend opcional del pipeline sobre SQLite (SCORING_BACKEND=sqlite): los CSV se
+cargan en una base local indexada y el cruce con las ofertas nacionales y
+regionales, los precios mínimos y la clasificación se ejecutan como SQL. Las
+consultas por POS leen solo las filas de ese POS, así la memoria del proceso no
+depende del largo del historial ni del tamaño del catálogo.
+
+Supone el archivo de pedidos de la exportación, con el vendor_id de la droguería.
+"""
+import os
+import sqlite3
+import traceback
+from contextlib import closing
+
+import pandas as pd
+
+from catalog_index import ZONA_NACIONAL
+from disk_cache import DIRECTORIO_CACHE
+from geo_zones import zonas_pos
+from landed_cost import agregar_costo_puesto
+from pipeline import (
+    ARCHIVO_CATALOGO,
+    ARCHIVO_PEDIDOS,
+    NOMBRES_FRAMES,
+    TAMANO_BLOQUE_PEDIDOS,
+    estadisticas_parciales,
+    finalizar_estadisticas,
+    huella_pipeline,
+    leer_archivos_basicos,
+    leer_pedidos_por_bloques,
+)
+from profiling import etapa
+from schemas import ESQUEMAS, aplicar_esquema, leer_csv_tipado, reporte_memoria
+from scoring_engine import (
+    CATEGORIAS_CLASIFICACION,
+    CLASIFICACION_DROGUERIA,
+    CLASIFICACION_VENDOR_MINIMO,
+    CLASIFICACION_VENDOR_NO_MINIMO,
+    combinar_kpis_parciales,
+    finalizar_kpis,
+    kpis_parciales,
+)
+
+RUTA_BASE = os.path.join(DIRECTORIO_CACHE, 'scoring.sqlite')
+
+# POS por consulta al calcular los agregados de toda la red
+POS_POR_LOTE = 2000
+
+INDICES = {
+    'catalogo_producto': 'catalogo(super_catalog_id)',
+    'catalogo_producto_zona': 'catalogo(super_catalog_id, name)',
+    'relaciones_pos_vendor': 'relaciones(point_of_sale_id, vendor_id)',
+    'pedidos_orden': 'pedidos(order_id)',
+    'pedidos_pos': 'pedidos(point_of_sale_id)',
+    'zonas_pos': 'pos_zonas(point_of_sale_id)',
+}
+
+# Tipos de las columnas de clasificado al leerlas de la base (los mismos que en
+# el pipeline en memoria: vendor_id y status de la relación quedan en float por los NaN)
+_ESQUEMA_PEDIDOS = ESQUEMAS[ARCHIVO_PEDIDOS]
+_ESQUEMA_CATALOGO = ESQUEMAS[ARCHIVO_CATALOGO]
+ESQUEMA_CLASIFICADO = {
+    **{col: dtype for col, dtype in _ESQUEMA_PEDIDOS.items() if col not in ('vendor_id', 'geo_zone')},
+    'vendor_id_x': _ESQUEMA_PEDIDOS['vendor_id'],
+    'vendor_id_y': _ESQUEMA_CATALOGO['vendor_id'],
+    'name': _ESQUEMA_CATALOGO['name'],
+    'base_price': 'float64',
+    'percentage': 'float64',
+    'precio_vendedor': 'float64',
+    'precio_total_vendedor': 'float64',
+    'vendor_id': 'float64',
+    'status': 'float64',
+    'precio_minimo_orders': 'float64',
+}
+
+
+def conectar(ruta=RUTA_BASE):
+    """
+    Conexión nueva a la base (una por consulta: los reruns de Streamlit corren en
+    hilos distintos y sqlite3 no comparte conexiones entre hilos)
+    """
+    return closing(sqlite3.connect(ruta))
+
+
+def _columnas(con, tabla):
+    return [fila[1] for fila in con.execute(f'PRAGMA table_info("{tabla}")')]
+
+
+def _cargar_tablas(con, pos_geo_zones, df_vendors_pos, tamano_bloque):
+    """
+    Pedidos (por bloques), catálogo, relaciones y zonas de los POS; el rowid de
+    cada tabla conserva el orden de las filas del CSV
+    """
+    filas = 0
+    for bloque in leer_pedidos_por_bloques(ARCHIVO_PEDIDOS, tamano_bloque):
+        bloque = bloque.drop(columns=['geo_zone'], errors='ignore')
+        bloque.to_sql('pedidos', con, if_exists='replace' if filas == 0 else 'append', index=False)
+        filas += len(bloque)
+
+    if filas == 0 or 'vendor_id' not in _columnas(con, 'pedidos'):
+        raise ValueError(f"{ARCHIVO_PEDIDOS} está vacío o no tiene vendor_id")
+
+    catalogo = leer_csv_tipado(ARCHIVO_CATALOGO)
+    catalogo[['vendor_id', 'super_catalog_id', 'name', 'base_price', 'percentage']].to_sql(
+        'catalogo', con, if_exists='replace', index=False)
+    # Una relación por (POS, vendor), la primera, como en adjuntar_status_relacion
+    (df_vendors_pos[['point_of_sale_id', 'vendor_id', 'status']]
+     .drop_duplicates(['point_of_sale_id', 'vendor_id'], keep='first')
+     .to_sql('relaciones', con, if_exists='replace', index=False))
+    pos_geo_zones.to_sql('pos_zonas', con, if_exists='replace', index=False)
+
+    return filas + len(catalogo) + len(df_vendors_pos) + len(pos_geo_zones)
+
+
+def sql_clasificacion(columnas_pedidos):
+    """
+    Consulta que materializa clasificado con el mismo resultado que clasificar_pedidos:
+    ofertas regionales de la zona del POS y luego las nacionales, status de la
+    relación (POS, vendor), mínimo local por (POS, orden, producto) y
+    clasificación por (orden, producto), ordenado por POS conservando el orden
+    de las ofertas dentro de cada uno
+    """
+    pedido = ', '.join(
+        f'p."{col}" AS "{"vendor_id_x" if col == "vendor_id" else col}"' for col in columnas_pedidos
+    )
+    salida = [('vendor_id_x' if col == 'vendor_id' else col) for col in columnas_pedidos]
+    salida += ['geo_zone', 'vendor_id_y', 'name', 'base_price', 'percentage', 'precio_vendedor',
+               'precio_total_vendedor', 'vendor_id', 'status', 'precio_minimo_orders']
+    oferta = """c.rowid AS fila_catalogo, c.vendor_id AS vendor_id_y, c.name AS name, c.base_price AS base_price,
+               COALESCE(c.percentage, 0) AS percentage,
+               c.base_price + (c.base_price * COALESCE(c.percentage, 0) / 100) AS precio_vendedor"""
+
+    return f"""
+    CREATE TABLE clasificado AS
+    WITH lineas AS (
+        SELECT p.rowid AS fila_pedido, z.rowid AS fila_zona, {pedido}, z.geo_zone AS geo_zone
+        FROM pedidos p LEFT JOIN pos_zonas z ON z.point_of_sale_id = p.point_of_sale_id
+        WHERE p.unidades_pedidas > 0
+    ),
+    ofertas AS (
+        SELECT 0 AS parte, l.*, {oferta}
+        FROM lineas l JOIN catalogo c ON c.super_catalog_id = l.super_catalog_id AND c.name IS l.geo_zone
+        WHERE c.name IS NOT :nacional
+        UNION ALL
+        SELECT 1 AS parte, l.*, {oferta}
+        FROM lineas l JOIN catalogo c ON c.super_catalog_id = l.super_catalog_id AND c.name = :nacional
+    ),
+    precios AS (
+        SELECT o.*,
+               o.unidades_pedidas * o.precio_vendedor AS precio_total_vendedor,
+               r.vendor_id AS vendor_id,
+               r.status AS status,
+               MIN(o.precio_minimo) OVER (PARTITION BY o.point_of_sale_id, o.order_id, o.super_catalog_id)
+                   AS precio_minimo_orders,
+               FIRST_VALUE(o.precio_minimo) OVER (
+                   PARTITION BY o.order_id, o.super_catalog_id
+                   ORDER BY o.parte, o.fila_pedido, o.fila_zona, o.fila_catalogo
+               ) AS precio_minimo_grupo,
+               MIN(o.precio_vendedor) OVER (PARTITION BY o.order_id, o.super_catalog_id) AS min_precio_vendedor
+        FROM ofertas o
+        LEFT JOIN relaciones r ON r.point_of_sale_id = o.point_of_sale_id AND r.vendor_id = o.vendor_id_y
+    )
+    SELECT {', '.join(f'"{col}"' for col in salida)},
+           CASE
+               WHEN order_id IS NULL OR super_catalog_id IS NULL THEN ''
+               WHEN precio_minimo_grupo < precio_vendedor THEN '{CLASIFICACION_DROGUERIA}'
+               WHEN precio_vendedor = min_precio_vendedor THEN '{CLASIFICACION_VENDOR_MINIMO}'
+               ELSE '{CLASIFICACION_VENDOR_NO_MINIMO}'
+           END AS clasificacion
+    FROM precios
+    ORDER BY point_of_sale_id, parte, fila_pedido, fila_zona, fila_catalogo
+    """
+
+
+def construir_base(pos_geo_zones, df_vendors_pos, huella, ruta=RUTA_BASE, tamano_bloque=TAMANO_BLOQUE_PEDIDOS):
+    """
+    Crea la base desde los CSV: tablas, índices y la tabla clasificado. Se escribe
+    en un archivo temporal que reemplaza al anterior al terminar.
+    """
+    os.makedirs(os.path.dirname(ruta) or '.', exist_ok=True)
+    temporal = f"{ruta}.tmp-{os.getpid()}"
+    if os.path.exists(temporal):
+        os.remove(temporal)
+
+    try:
+        with closing(sqlite3.connect(temporal)) as con:
+            con.execute('PRAGMA journal_mode = OFF')
+            con.execute('PRAGMA synchronous = OFF')
+
+            with etapa('sql.cargar_tablas') as m:
+                m.salida(_cargar_tablas(con, pos_geo_zones, df_vendors_pos, tamano_bloque))
+
+            with etapa('sql.indices'):
+                for nombre, definicion in INDICES.items():
+                    con.execute(f'CREATE INDEX {nombre} ON {definicion}')
+                con.execute('ANALYZE')
+
+            with etapa('sql.clasificacion') as m:
+                columnas_pedidos = _columnas(con, 'pedidos')
+                con.execute(sql_clasificacion(columnas_pedidos), {'nacional': ZONA_NACIONAL})
+                con.execute('CREATE INDEX clasificado_pos ON clasificado(point_of_sale_id)')
+                m.salida(con.execute('SELECT COUNT(*) FROM clasificado').fetchone()[0])
+
+            con.execute('CREATE TABLE metadatos (clave TEXT PRIMARY KEY, valor TEXT)')
+            con.execute("INSERT INTO metadatos VALUES ('huella', ?)", (huella,))
+            con.commit()
+        os.replace(temporal, ruta)
+    except Exception:
+        if os.path.exists(temporal):
+            os.remove(temporal)
+        raise
+
+    return ruta
+
+
+def base_vigente(huella, ruta=RUTA_BASE):
+    """
+    True si la base existe y se construyó con la huella indicada
+    """
+    if not os.path.exists(ruta):
+        return False
+    try:
+        with conectar(ruta) as con:
+            fila = con.execute("SELECT valor FROM metadatos WHERE clave = 'huella'").fetchone()
+    except sqlite3.Error:
+        return False
+    return fila is not None and fila[0] == huella
+
+
+def tipar_clasificado(df):
+    """
+    Tipos del pipeline en memoria para las filas de clasificado leídas de la base
+    """
+    df = aplicar_esquema(df, ESQUEMA_CLASIFICADO)
+    df['clasificacion'] = pd.Categorical(df['clasificacion'], categories=CATEGORIAS_CLASIFICACION)
+    return df
+
+
+def leer_clasificado(con, condicion='', parametros=()):
+    """
+    Filas de clasificado que cumplen la condición SQL, en el orden de la tabla
+    """
+    consulta = f"SELECT * FROM clasificado {condicion} ORDER BY rowid"
+    return tipar_clasificado(pd.read_sql_query(consulta, con, params=parametros))
+
+
+def agregados_por_lotes(ruta=RUTA_BASE, pos_por_lote=POS_POR_LOTE):
+    """
+    pos_order_stats, pos_vendor_totals, kpis_ahorro y país de cada POS, leyendo
+    de la base un rango de POS por vez (cada POS cae entero en un lote)
+    """
+    ordenes, vendor_totals, paises = [], [], []
+    kpis = None
+
+    with conectar(ruta) as con:
+        pos = [fila[0] for fila in con.execute('SELECT DISTINCT point_of_sale_id FROM pedidos ORDER BY 1')]
+        for inicio in range(0, len(pos), pos_por_lote):
+            rango = (pos[inicio], pos[min(inicio + pos_por_lote, len(pos)) - 1])
+            condicion = 'WHERE point_of_sale_id BETWEEN ? AND ?'
+
+            df_pedidos = aplicar_esquema(
+                pd.read_sql_query(f"SELECT * FROM pedidos {condicion} ORDER BY rowid", con, params=rango),
+                _ESQUEMA_PEDIDOS)
+            ordenes_lote, vendor_totals_lote = estadisticas_parciales(df_pedidos)
+            ordenes.append(ordenes_lote)
+            vendor_totals.append(vendor_totals_lote)
+            if 'country' in df_pedidos.columns:
+                paises.append(df_pedidos[['point_of_sale_id', 'country']].drop_duplicates('point_of_sale_id'))
+
+            kpis = combinar_kpis_parciales(kpis, kpis_parciales(leer_clasificado(con, condicion, rango)))
+
+    concatenar = lambda partes: pd.concat(partes, ignore_index=True) if partes else None
+    pos_order_stats, pos_vendor_totals = finalizar_estadisticas(concatenar(ordenes), concatenar(vendor_totals))
+    return {
+        'pos_order_stats': pos_order_stats,
+        'pos_vendor_totals': pos_vendor_totals,
+        'kpis_ahorro': finalizar_kpis(kpis),
+        'paises': concatenar(paises) if paises else pd.DataFrame(columns=['point_of_sale_id', 'country']),
+    }
+
+
+def procesar_datos_sql(huella=None, ruta=RUTA_BASE):
+    """
+    procesar_datos con el backend sqlite: construye la base y devuelve los frames
+    en el orden de NOMBRES_FRAMES con df_clasificado vacío (las ofertas se leen
+    por POS con ClasificadoSQL) y df_pedidos reducido al país de cada POS
+    """
+    try:
+        df_pos_address, df_vendors_pos, df_vendor_dm, df_min_purchase = leer_archivos_basicos()
+        with etapa('pipeline.zonas_pos', df_pos_address) as m:
+            pos_geo_zones = m.salida(zonas_pos(df_pos_address))
+
+        construir_base(pos_geo_zones, df_vendors_pos, huella or huella_pipeline(), ruta)
+        with etapa('sql.agregados'):
+            agregados = agregados_por_lotes(ruta)
+
+        frames = (agregados['pos_vendor_totals'], agregados['paises'], agregados['pos_order_stats'],
+                  df_min_purchase, df_vendor_dm, pos_geo_zones, pd.DataFrame(), df_vendors_pos,
+                  agregados['kpis_ahorro'])
+        print("Memoria por frame:\n" + reporte_memoria(dict(zip(NOMBRES_FRAMES, frames))).to_string(index=False))
+        return frames
+
+    except Exception:
+        print("Error en process_data (sqlite):", traceback.format_exc())
+        return tuple(pd.DataFrame() for _ in NOMBRES_FRAMES)
+
+
+class ClasificadoSQL:
+    """
+    Ofertas clasificadas guardadas en la base, con la interfaz de consulta de
+    IndicePOS: obtener(pos) lee solo las filas de ese POS. Con condiciones de
+    compra les agrega el costo puesto (las canastas no salen de las órdenes del POS).
+    """
+
+    def __init__(self, ruta=RUTA_BASE, condiciones=None):
+        self.ruta = ruta
+        self.condiciones = condiciones
+        with conectar(ruta) as con:
+            self._claves = [fila[0] for fila in
+                            con.execute('SELECT DISTINCT point_of_sale_id FROM clasificado ORDER BY 1')]
+            self._filas = con.execute('SELECT COUNT(*) FROM clasificado').fetchone()[0]
+        self._conjunto = set(self._claves)
+
+    @property
+    def empty(self):
+        return self._filas == 0
+
+    @property
+    def claves(self):
+        return list(self._claves)
+
+    def __contains__(self, pos):
+        return pos in self._conjunto
+
+    def __len__(self):
+        return self._filas
+
+    def obtener(self, pos):
+        """
+        Filas del POS en el mismo orden que en el pipeline en memoria
+        """
+        with conectar(self.ruta) as con:
+            df = leer_clasificado(con, 'WHERE point_of_sale_id = ?', (int(pos),))
+        if self.condiciones is not None:
+            df = agregar_costo_puesto(df, self.condiciones)
+        return df
@@ -0,0 +1,118 @@
+"""
+Precálculo en segundo plano de las consultas por POS de la página (KPIs, análisis
+por vendor y por producto), de los POS con más compras a los con menos, sobre una
+caché acotada compartida. La página nunca espera al precálculo: si el POS ya está
+caliente lo lee de la caché y si no lo calcula en el momento.
+"""
+import os
+import threading
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+
+from pos_cache import MAX_ENTRADAS_DEFECTO, MAX_MB_DEFECTO, TTL_DEFECTO, CachePOS
+
+CONSULTAS_PRECALENTADAS = ['kpis', 'analisis_vendors', 'analisis_productos']
+
+# SCORING_PRECALENTAR=0 lo desactiva; hilos y límites de la caché configurables
+# (SCORING_CACHE_POS_MB=0 o SCORING_CACHE_POS_TTL=0 quitan ese límite)
+PRECALENTAR = os.environ.get('SCORING_PRECALENTAR', '1') != '0'
+HILOS_PRECALENTAR = int(os.environ.get('SCORING_HILOS_PRECALENTAR', '2'))
+MAX_ENTRADAS_CACHE = int(os.environ.get('SCORING_CACHE_POS', str(MAX_ENTRADAS_DEFECTO)))
+MAX_MB_CACHE = float(os.environ.get('SCORING_CACHE_POS_MB', str(MAX_MB_DEFECTO)))
+TTL_CACHE = float(os.environ.get('SCORING_CACHE_POS_TTL', str(TTL_DEFECTO)))
+
+
+def pos_por_volumen(motor):
+    """
+    POS del motor ordenados por total comprado, de mayor a menor
+    """
+    pos_vendor_totals = motor.frames['pos_vendor_totals']
+    if pos_vendor_totals.empty or 'total_compra' not in pos_vendor_totals.columns:
+        return list(motor.pos_disponibles)
+    volumen = pos_vendor_totals.groupby('point_of_sale_id', sort=True)['total_compra'].sum()
+    return volumen.sort_values(ascending=False, kind='stable').index.tolist()
+
+
+class Precalentador:
+    """
+    Consultas por POS de un MotorScoring con una caché acotada que un pool de
+    hilos llena en segundo plano
+    """
+
+    def __init__(self, motor, consultas=CONSULTAS_PRECALENTADAS, hilos=HILOS_PRECALENTAR,
+                 max_entradas=MAX_ENTRADAS_CACHE, max_mb=MAX_MB_CACHE, ttl=TTL_CACHE):
+        self.motor = motor
+        self.consultas = list(consultas)
+        self.hilos = max(1, hilos)
+        self.cache = CachePOS(max_entradas, max_bytes=int(max_mb * 1024 ** 2) if max_mb else None,
+                              ttl=ttl or None)
+        self._detener = threading.Event()
+        self._hilo = None
+        self._lock = threading.Lock()
+        self.precalentados = 0
+
+    def consultar(self, pos, consulta, *args):
+        """
+        Resultado de motor.<consulta>(pos, *args), de la caché si ya se calculó
+        """
+        return self.cache.obtener_o_calcular((pos, consulta) + args,
+                                             lambda: getattr(self.motor, consulta)(pos, *args))
+
+    def iniciar(self):
+        """
+        Lanza el precálculo en un hilo daemon y vuelve enseguida
+        """
+        if self._hilo is None:
+            self._hilo = threading.Thread(target=self._precalentar, name='precalentar-pos', daemon=True)
+            self._hilo.start()
+        return self
+
+    def detener(self):
+        self._detener.set()
+
+    @property
+    def activo(self):
+        return self._hilo is not None and self._hilo.is_alive()
+
+    def _precalentar_pos(self, pos):
+        # Sin pasar por obtener: el precálculo no cuenta como aciertos ni fallos
+        try:
+            for consulta in self.consultas:
+                if self._detener.is_set() or self.cache.llena:
+                    return
+                if (pos, consulta) not in self.cache:
+                    self.cache.guardar((pos, consulta), getattr(self.motor, consulta)(pos))
+        except Exception:
+            print(f"Error en el precálculo del POS {pos}:", traceback.format_exc())
+            return
+        with self._lock:
+            self.precalentados += 1
+
+    def _precalentar(self):
+        # Solo mientras la caché tenga lugar: los POS siguientes desalojarían a
+        # los de más volumen
+        capacidad = self.cache.max_entradas // max(1, len(self.consultas))
+        pendientes = pos_por_volumen(self.motor)[:capacidad]
+        with ThreadPoolExecutor(max_workers=self.hilos, thread_name_prefix='precalentar') as pool:
+            for futuro in [pool.submit(self._precalentar_pos, pos) for pos in pendientes]:
+                if self._detener.is_set() or self.cache.llena:
+                    pool.shutdown(cancel_futures=True)
+                    break
+                futuro.result()
+
+
+_actual = None
+_lock_actual = threading.Lock()
+
+
+def precalentar(motor, **opciones):
+    """
+    Precalentador del motor ya iniciado (si PRECALENTAR está activo). Detiene el
+    del motor anterior, que ya no se consulta cuando cambian las entradas.
+    """
+    global _actual
+    with _lock_actual:
+        if _actual is not None and _actual.motor is not motor:
+            _actual.detener()
+        _actual = Precalentador(motor, **opciones)
+        return _actual.iniciar() if PRECALENTAR else _actual